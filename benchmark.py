@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the event engine in main.py
+
+Runs the random mode over a matrix of farm sizes, arrival rates, Tlimit values,
+simulation lengths, engines and event lists the way main.py runs a test: jobs are
+generated lazily while the simulation runs and departures are streamed to the dep
+file. Reports jobs/second, events/second (events engine), peak memory and the time
+spent in workload generation, simulation and output. Results are saved as JSON so
+that runs can be compared, e.g.
+
+    python3 benchmark.py --save before.json
+    python3 benchmark.py --save after.json --compare before.json
+    python3 benchmark.py --engine events pipeline --event-list heap calendar --numpy
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+from main import (ENGINES, EVENT_LISTS, Config, DepartureWriter, Instrumentation, PipelineSimulation, RandomStreams,
+                  SimulationManager)
+
+
+def make_config(n, n0, lamb, t_limit, time_end, engine='events', event_list='heap', use_numpy=False):
+    # Service time parameters of config/service_6.txt
+    config = Config('random', n, n0, t_limit, time_end=time_end, interarrival=[lamb, 0.97, 1.14],
+                    service=[0.89, [1.9, 4.5, 2.6], [2.9, 4.1]])
+    config.engine = engine
+    config.event_list = event_list
+    config.use_numpy = use_numpy
+    return config
+
+
+def run_case(config, seed, out_folder):
+    # As run_test in main.py. The events engine draws the jobs lazily while it runs, so the generation phase is
+    # the time Instrumentation measures in schedule_next_arrival, taken out of the simulation phase (which
+    # includes writing the dep file); the pipeline engine reads all jobs into columns before it runs the farms
+    config.streams = RandomStreams(seed)
+    phases = {}
+    if config.engine == 'pipeline':
+        simulation = PipelineSimulation()
+        start = time.perf_counter()
+        simulation.read_jobs(config)
+        phases['generation'] = time.perf_counter() - start
+        start = time.perf_counter()
+        simulation.run_farms(config)
+        phases['simulation'] = time.perf_counter() - start
+        num_events = None
+        num_jobs = len(simulation.arrival_time)
+    else:
+        simulation = SimulationManager()
+        simulation.finished_jobs = DepartureWriter(os.path.join(out_folder, 'dep_bench.txt'))
+        instrumentation = Instrumentation().attach(simulation)
+        start = time.perf_counter()
+        simulation.run_config(config)
+        phases['generation'] = instrumentation.handler_time['generation']
+        phases['simulation'] = time.perf_counter() - start - phases['generation']
+        num_events = simulation.num_events
+        num_jobs = len(simulation.finished_jobs)
+
+    start = time.perf_counter()
+    simulation.write_output('bench', out_folder)
+    phases['output'] = time.perf_counter() - start
+    return num_events, num_jobs, phases
+
+
+def peak_memory(config, seed, out_folder):
+    tracemalloc.start()
+    run_case(config, seed, out_folder)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark(n_values, n0_fraction, lamb_values, t_limit_values, time_end_values, seed=0, measure_memory=True,
+              engines=('events',), event_lists=('heap',), use_numpy=False):
+    # The event list only matters to the events engine
+    engine_cases = [(engine, event_list) for engine in engines
+                    for event_list in (event_lists if engine == 'events' else [None])]
+    cases = []
+    with tempfile.TemporaryDirectory() as out_folder:
+        for n, lamb, t_limit, time_end, (engine, event_list) in itertools.product(
+                n_values, lamb_values, t_limit_values, time_end_values, engine_cases):
+            n0 = max(1, min(n - 1, round(n * n0_fraction)))
+            config = make_config(n, n0, lamb, t_limit, time_end, engine, event_list or 'heap', use_numpy)
+            num_events, num_jobs, phases = run_case(config, seed, out_folder)
+            case = {'n': n, 'n0': n0, 'lamb': lamb, 't_limit': t_limit, 'time_end': time_end, 'engine': engine,
+                    'event_list': event_list, 'numpy': use_numpy, 'jobs': num_jobs, 'events': num_events,
+                    'jobs_per_second': num_jobs / phases['simulation'], 'phases': phases}
+            if num_events is not None:
+                case['events_per_second'] = num_events / phases['simulation']
+            if measure_memory:
+                case['peak_memory'] = peak_memory(config, seed, out_folder)
+            cases.append(case)
+            print_case(case)
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'machine': platform.machine(), 'seed': seed, 'cases': cases}
+
+
+def case_key(case):
+    # Results saved before the engine options were added are events engine runs on the heap
+    return (case['n'], case['n0'], case['lamb'], case['t_limit'], case['time_end'], case.get('engine', 'events'),
+            case.get('event_list', 'heap'), case.get('numpy', False))
+
+
+def print_case(case, baseline=None):
+    phases = case['phases']
+    engine = case['engine'] + (f"/{case['event_list']}" if case['event_list'] else '') + ('+numpy' * case['numpy'])
+    line = (f"n={case['n']:<4} n0={case['n0']:<4} lamb={case['lamb']:<6} Tlimit={case['t_limit']:<5} "
+            f"time_end={case['time_end']:<8} {engine:<20} jobs/s={case['jobs_per_second']:>10.0f} ")
+    if 'events_per_second' in case:
+        line += f"events/s={case['events_per_second']:>10.0f} "
+    if 'generation' in phases:
+        line += f"gen={phases['generation']:.3f}s "
+    line += f"sim={phases['simulation']:.3f}s out={phases['output']:.3f}s"
+    if 'peak_memory' in case:
+        line += f" peak={case['peak_memory'] / 2 ** 20:.1f}MiB"
+    if baseline is not None and 'jobs_per_second' in baseline:
+        line += f" speedup={case['jobs_per_second'] / baseline['jobs_per_second']:.2f}x"
+    print(line)
+
+
+def compare(results, baseline_results):
+    baseline_cases = {case_key(case): case for case in baseline_results['cases']}
+    print(f"Compared with {baseline_results['timestamp']}:")
+    for case in results['cases']:
+        print_case(case, baseline_cases.get(case_key(case)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engine of main.py")
+    parser.add_argument("--n", type=int, nargs="+", default=[5, 20, 100], help="total numbers of servers")
+    parser.add_argument("--n0-fraction", type=float, default=0.6, help="fraction of the servers in group 0")
+    parser.add_argument("--lamb", type=float, nargs="+", default=[1.0, 3.0], help="arrival rates")
+    parser.add_argument("--t-limit", type=float, nargs="+", default=[3.2], help="group 0 time limits")
+    parser.add_argument("--time-end", type=float, nargs="+", default=[1000, 10000], help="simulation lengths")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the workload")
+    parser.add_argument("--engine", nargs="+", default=["events"], choices=list(ENGINES), help="engines to run")
+    parser.add_argument("--event-list", nargs="+", default=["heap"], choices=list(EVENT_LISTS),
+                        help="event lists of the events engine to run")
+    parser.add_argument("--numpy", action="store_true", help="generate the workload with numpy")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slower) peak memory measurement")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+    results = benchmark(args.n, args.n0_fraction, args.lamb, args.t_limit, args.time_end, args.seed,
+                        not args.no_memory, args.engine, args.event_list, args.numpy)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
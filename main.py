@@ -1,58 +1,351 @@
+import argparse
+from bisect import bisect_right
+import copy
+import cProfile
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import heapq
-from math import inf
+import json
+import mmap
+import io
+import os
+import pickle
+from math import atan, ceil, cos, exp, inf, isfinite, lgamma, log, pi, sin, sqrt, tan
 import random
+import shutil
+import struct
+import pstats
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+# Response time quantiles written next to the mean response times
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Weights of the class 0 and class 1 mean response times in the objective w0 * T0/n0 + w1 * T1/n1,
+# with more classes the objective is the sum of w[k] * T[k]/n[k]
+WEIGHTS = (0.83, 0.059)
 
 
 class Job:
+    __slots__ = ('arrival_time', 'service_time', 'server_type', 'job_class', 'is_rerouted', 'served_time',
+                 'finish_time', 'start_time')
+
     def __init__(self, arrival_time, service_time, server_type):
         self.arrival_time = arrival_time
         self.service_time = service_time
         self.server_type = server_type
+        # The class the job arrived with; server_type changes when a job is rerouted
+        self.job_class = server_type
+        self.is_rerouted = False
+        # Service already received before a time limit cut the job, only kept by some policies
+        self.served_time = 0
         self.finish_time = None
         self.start_time = None
 
 
 class Server:
-    def __init__(self, server_type, t_limit):
+    __slots__ = ('server_type', 't_limit', 'index', 'is_busy', 'current_job')
+
+    def __init__(self, server_type, t_limit, index=0):
         self.server_type = server_type
         self.t_limit = t_limit
+        # Position of the server in its farm
+        self.index = index
         self.is_busy = False
         self.current_job = None
 
+    def cuts(self, job):
+        # True when the time limit ends the job before its service is complete
+        return job.service_time - job.served_time > self.t_limit
+
     def assign_job(self, job, current_time):
         self.is_busy = True
         self.current_job = job
-        if self.server_type == 0 and job.service_time > self.t_limit:
+        job.start_time = current_time
+        if self.cuts(job):
             job.finish_time = current_time + self.t_limit
         else:
-            job.finish_time = current_time + job.service_time
+            job.finish_time = current_time + job.service_time - job.served_time
 
 
-class Event:
-    def __init__(self, event_time, event_type, job):
-        self.event_time = event_time
-        self.event_type = event_type
-        self.job = job
+## Events are tuples (event_time, event_type, sequence, job, server), server being the one a departing job
+# leaves from. Tie rule: events at the same time are ordered by type, departures before arrivals, so a server
+# freed at time t (and a job rerouted at t) is seen by an arrival at t; events of the same time and type are
+# processed in the order they were scheduled (sequence). Every key is unique, so jobs are never compared.
+# EventList.event builds these tuples for every event list, and PipelineSimulation orders its ties the same way
+DEPARTURE = 0
+ARRIVAL = 1
+EVENT_NAMES = {DEPARTURE: 'departure', ARRIVAL: 'arrival'}
 
-    def __lt__(self, other):
-        return self.event_time < other.event_time
 
+class EventList:
+    # Base of the event lists, which only differ in how they store the events
 
-class GenerateVariable:
     def __init__(self):
+        self.sequence = 0
+
+    def event(self, event_time, event_type, job, server):
+        # The event tuple, its first three elements are the key that orders the events
+        self.sequence += 1
+        return event_time, event_type, self.sequence, job, server
+
+
+class HeapEventList(EventList):
+    # Binary heap of events
+    name = 'heap'
+
+    def __init__(self):
+        super().__init__()
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, event_time, event_type, job, server=None):
+        heapq.heappush(self.heap, self.event(event_time, event_type, job, server))
+
+    def pop(self):
+        return heapq.heappop(self.heap)
+
+    def next_time(self):
+        # Time of the next event, the list is not empty
+        return self.heap[0][0]
+
+
+class CalendarEventList(EventList):
+    # Calendar queue (Brown 1988): a ring of num_buckets small heaps, each covering bucket_width of time per
+    # "year". An event goes to bucket int(time / bucket_width) % num_buckets, and the list is read by walking
+    # the ring from the bucket of the current time. The ring is rebuilt with twice or half the buckets as the
+    # number of events grows or shrinks, and the width is set from the spacing of the next events, so push and
+    # pop take O(1) on average however many events are pending
+    name = 'calendar'
+
+    def __init__(self, num_buckets=16, bucket_width=1.0):
+        super().__init__()
+        self.size = 0
+        self.resize(num_buckets, bucket_width)
+
+    def __len__(self):
+        return self.size
+
+    def resize(self, num_buckets, bucket_width):
+        entries = [entry for bucket in getattr(self, 'buckets', ()) for entry in bucket]
+        self.num_buckets = num_buckets
+        self.bucket_width = bucket_width
+        self.buckets = [[] for _ in range(num_buckets)]
+        # Bucket number int(time / bucket_width) of the current time, no event is earlier
+        self.current_bucket = min((int(entry[0] / bucket_width) for entry in entries), default=0)
+        for entry in entries:
+            heapq.heappush(self.buckets[int(entry[0] / bucket_width) % num_buckets], entry)
+
+    def rebuild(self, num_buckets):
+        # The new width is three times the mean spacing of the next (up to) 25 events
+        times = sorted(entry[0] for bucket in self.buckets for entry in bucket)[:25]
+        bucket_width = self.bucket_width
+        if len(times) > 1 and times[-1] > times[0]:
+            bucket_width = 3 * (times[-1] - times[0]) / (len(times) - 1)
+        self.resize(num_buckets, bucket_width)
+
+    def push(self, event_time, event_type, job, server=None):
+        bucket = int(event_time / self.bucket_width)
+        if bucket < self.current_bucket:
+            self.current_bucket = bucket
+        heapq.heappush(self.buckets[bucket % self.num_buckets], self.event(event_time, event_type, job, server))
+        self.size += 1
+        if self.size > 2 * self.num_buckets:
+            self.rebuild(2 * self.num_buckets)
+
+    def find(self):
+        # The bucket holding the next event; current_bucket moves up to it
+        buckets = self.buckets
+        bucket_width = self.bucket_width
+        for _ in range(self.num_buckets):
+            bucket = buckets[self.current_bucket % self.num_buckets]
+            if bucket and int(bucket[0][0] / bucket_width) <= self.current_bucket:
+                return bucket
+            self.current_bucket += 1
+        # Nothing within a year, jump to the earliest event
+        bucket = min((bucket for bucket in buckets if bucket), key=lambda bucket: bucket[0])
+        self.current_bucket = int(bucket[0][0] / bucket_width)
+        return bucket
+
+    def pop(self):
+        entry = heapq.heappop(self.find())
+        self.size -= 1
+        if self.size < self.num_buckets // 2 and self.num_buckets > 16:
+            self.rebuild(self.num_buckets // 2)
+        return entry
+
+    def next_time(self):
+        return self.find()[0][0]
+
+
+EVENT_LISTS = {event_list.name: event_list for event_list in (HeapEventList, CalendarEventList)}
+
+
+class JobTable:
+    # Completed jobs stored column-wise in typed arrays instead of one Job object each,
+    # rows are read back as Job objects
+    def __init__(self):
+        self.arrival_time = array('d')
+        self.service_time = array('d')
+        self.job_class = array('b')
+        self.server_type = array('b')
+        self.is_rerouted = array('b')
+        self.start_time = array('d')
+        self.finish_time = array('d')
+
+    def __len__(self):
+        return len(self.arrival_time)
+
+    def append(self, job):
+        self.arrival_time.append(job.arrival_time)
+        self.service_time.append(job.service_time)
+        self.job_class.append(job.job_class)
+        self.server_type.append(job.server_type)
+        self.is_rerouted.append(job.is_rerouted)
+        self.start_time.append(job.start_time)
+        self.finish_time.append(job.finish_time)
+
+    def __getitem__(self, index):
+        job = Job(self.arrival_time[index], self.service_time[index], self.job_class[index])
+        job.server_type = self.server_type[index]
+        job.is_rerouted = bool(self.is_rerouted[index])
+        job.start_time = self.start_time[index]
+        job.finish_time = self.finish_time[index]
+        return job
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class DepartureWriter:
+    # Takes the place of finished_jobs: completed jobs are written to the dep file as they leave,
+    # in large chunks, instead of being kept in memory. Jobs complete in event order, so the lines
+    # come out sorted by departure time. Without a file path the jobs are only counted
+    def __init__(self, file_path=None, buffer_size=10000):
+        self.file = open(file_path, 'w') if file_path else None
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.num_jobs = 0
+
+    def __len__(self):
+        return self.num_jobs
+
+    def __getstate__(self):
+        # A checkpoint records how much of the dep file has been written
+        if self.file is not None:
+            self.flush()
+            self.file.flush()
+        state = self.__dict__.copy()
+        state['file'] = None
+        state['file_path'] = None
+        if self.file is not None:
+            state['file_path'] = self.file.name
+            state['file_size'] = self.file.tell()
+        return state
+
+    def __setstate__(self, state):
+        # On resume, lines written after the checkpoint are dropped and writing continues from there
+        file_path = state.pop('file_path')
+        file_size = state.pop('file_size', 0)
+        self.__dict__.update(state)
+        if file_path is not None:
+            os.truncate(file_path, file_size)
+            self.file = open(file_path, 'a')
+
+    def append(self, job):
+        self.num_jobs += 1
+        if self.file is None:
+            return
+        job_class = 'r' + str(job.job_class) if job.is_rerouted else str(job.job_class)
+        self.buffer.append(f'{job.arrival_time:.4f} {job.finish_time:.4f} {job_class} \n')
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.buffer))
+        self.buffer = []
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+class RandomStreams:
+    # Independent random number streams derived from a root seed. Each stream is named by a path, e.g.
+    # ('replication', 3, 'arrival'), and seeded with a hash of the root seed and the path, so streams never
+    # share numbers and drawing more numbers from one stream leaves the others unchanged. spawn() gives a
+    # child with a longer path, in the same way as numpy SeedSequence.spawn
+    def __init__(self, seed=None, path=()):
+        # Without a root seed one is drawn from the random module, so random.seed() still fixes the run
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.path = tuple(path)
+
+    def spawn(self, name):
+        return RandomStreams(self.seed, self.path + (name,))
+
+    def key(self, name):
+        text = '/'.join(str(part) for part in (self.seed,) + self.path + (name,))
+        return int.from_bytes(hashlib.sha256(text.encode()).digest()[:16], 'little')
+
+    def stream(self, name):
+        return random.Random(self.key(name))
+
+    def numpy_stream(self, name):
+        import numpy as np
+        return np.random.default_rng(np.random.SeedSequence(self.key(name)))
+
+
+def replication_streams(seed, num_replications):
+    # One child of the root seed per replication, so replications of different root seeds never overlap
+    root = RandomStreams(seed)
+    return [root.spawn(replication) for replication in range(num_replications)]
+
+
+class GenerateVariable:
+    def __init__(self, lamb=3.1, a2l=0.85, a2u=1.21, p0=0.74, alpha0=0.5, beta0=5.7, eta0=1.9, alpha1=2.7,
+                 eta1=2.5, time_end=1000, class_probabilities=None, service_distributions=None, streams=None):
         ## Simulation parameters
-        self.lamb = 3.1
-        self.a2l = 0.85
-        self.a2u = 1.21
+        self.lamb = lamb
+        self.a2l = a2l
+        self.a2u = a2u
         # Service rate
-        self.p0 = 0.74
-        self.alpha0 = 0.5
-        self.beta0 = 5.7
-        self.eta0 = 1.9
-        self.alpha1 = 2.7
-        self.eta1 = 2.5
+        self.p0 = p0
+        self.alpha0 = alpha0
+        self.beta0 = beta0
+        self.eta0 = eta0
+        self.alpha1 = alpha1
+        self.eta1 = eta1
+        ## K job classes: the probability of each class and its service time distribution, either
+        # bounded power law (alpha, beta, eta) or power law (alpha, eta). The default is the two classes above
+        if class_probabilities is None:
+            class_probabilities = [p0, 1 - p0]
+        if service_distributions is None:
+            service_distributions = [(alpha0, beta0, eta0), (alpha1, eta1)]
+        self.class_probabilities = class_probabilities
+        self.service_distributions = service_distributions
+        # Cumulative class probabilities, the class of a job is the number of them at or below a uniform draw
+        self.cumulative_probabilities = [sum(class_probabilities[:index + 1])
+                                         for index in range(len(class_probabilities) - 1)] + [1.0]
+        self.inverse_cdfs = [(service_inverse_cdf(distribution), distribution)
+                             for distribution in service_distributions]
+        ## One random stream per purpose: inter-arrival times, job classes and the service times of each class
+        self.streams = streams if streams is not None else RandomStreams()
+        self.arrival_random = self.streams.stream('arrival')
+        self.class_random = self.streams.stream('class')
+        self.service_randoms = [self.streams.stream(f'service{job_class}')
+                                for job_class in range(len(service_distributions))]
         # Simulation time
-        self.time_end = 1000
+        self.time_end = time_end
         self.arrival_times = []
         self.service_times = []
         ## Accounting parameters
@@ -64,8 +357,8 @@ class GenerateVariable:
     def generate_arrival_times(self):
         current_time = 0
         while current_time < self.time_end:
-            exp_time = random.expovariate(self.lamb)
-            uni_time = random.uniform(self.a2l, self.a2u)
+            exp_time = self.arrival_random.expovariate(self.lamb)
+            uni_time = self.arrival_random.uniform(self.a2l, self.a2u)
             inter_arrival_time = exp_time * uni_time
             current_time += inter_arrival_time
             if current_time < self.time_end:
@@ -74,107 +367,1154 @@ class GenerateVariable:
 
     def generate_service_time(self):
         for _ in range(len(self.arrival_times)):
-            server_group = 0 if random.random() < self.p0 else 1
-            if server_group == 0:
-                service_time = self._generate_group0_service_time()
-            else:
-                service_time = self._generate_group1_service_time()
-            self.service_times.append((server_group, service_time))
+            server_group = self.generate_job_class()
+            self.service_times.append((server_group, self.generate_class_service_time(server_group)))
         return self.service_times
 
-    def _generate_group0_service_time(self):
-        while True:
-            t = random.uniform(self.alpha0, self.beta0)
-            probability_density = self.eta0 / ((self.alpha0 ** -self.eta0) - (self.beta0 ** -self.eta0)) * (
-                    t ** (self.eta0 + 1))
-            if random.random() < probability_density:
-                return t
+    def generate_job_class(self):
+        return bisect_right(self.cumulative_probabilities, self.class_random.random())
+
+    def generate_class_service_time(self, job_class):
+        inverse_cdf, distribution = self.inverse_cdfs[job_class]
+        return inverse_cdf(self.service_randoms[job_class].random(), *distribution)
+
+    def iter_jobs(self):
+        # Same workload as generate_arrival_times and generate_service_time, one job at a time
+        return RandomJobSource(self)
+
+
+class NumpyGenerateVariable(GenerateVariable):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # numpy generators on the same streams as the random.Random ones
+        self.arrival_rng = self.streams.numpy_stream('arrival')
+        self.class_rng = self.streams.numpy_stream('class')
+        self.service_rngs = [self.streams.numpy_stream(f'service{job_class}')
+                             for job_class in range(len(self.inverse_cdfs))]
+
+    def generate_arrival_arrays(self):
+        import numpy as np
+        # Draw batches a little larger than the expected number of arrivals until time_end is passed
+        mean_inter_arrival_time = (self.a2l + self.a2u) / 2 / self.lamb
+        batch_size = int(self.time_end / mean_inter_arrival_time * 1.05) + 100
+        batches = []
+        current_time = 0
+        while current_time < self.time_end:
+            inter_arrival_times = self.arrival_rng.exponential(1 / self.lamb, batch_size) * \
+                self.arrival_rng.uniform(self.a2l, self.a2u, batch_size)
+            batch = current_time + np.cumsum(inter_arrival_times)
+            batches.append(batch)
+            current_time = batch[-1]
+        arrival_times = np.concatenate(batches)
+        return arrival_times[:np.searchsorted(arrival_times, self.time_end)]
+
+    def generate_service_arrays(self, size):
+        import numpy as np
+        server_groups = np.searchsorted(self.cumulative_probabilities, self.class_rng.random(size),
+                                        side='right').astype(np.int8)
+        service_times = np.empty(size)
+        for job_class, (inverse_cdf, distribution) in enumerate(self.inverse_cdfs):
+            in_class = server_groups == job_class
+            u = self.service_rngs[job_class].random(np.count_nonzero(in_class))
+            service_times[in_class] = inverse_cdf(u, *distribution)
+        return server_groups, service_times
+
+    def iter_jobs(self, batch_size=65536):
+        return NumpyJobSource(self, batch_size)
+
+    def generate_arrival_times(self):
+        self.arrival_times = self.generate_arrival_arrays().tolist()
+        return self.arrival_times
+
+    def generate_service_time(self):
+        server_groups, service_times = self.generate_service_arrays(len(self.arrival_times))
+        self.service_times = list(zip(server_groups.tolist(), service_times.tolist()))
+        return self.service_times
+
+
+def group0_inverse_cdf(u, alpha0, beta0, eta0):
+    # F(t) = (alpha0^-eta0 - t^-eta0) / (alpha0^-eta0 - beta0^-eta0), works on floats and numpy arrays
+    return ((alpha0 ** -eta0) - u * ((alpha0 ** -eta0) - (beta0 ** -eta0))) ** (-1 / eta0)
+
+
+def group1_inverse_cdf(u, alpha1, eta1):
+    # F(t) = 1 - (alpha1 / t)^eta1, u is in [0, 1) so 1 - u is never 0
+    return alpha1 * (1 - u) ** (-1 / eta1)
+
+
+def service_inverse_cdf(distribution):
+    # (alpha, beta, eta) is a bounded power law like group 0, (alpha, eta) a power law like group 1
+    if len(distribution) == 3:
+        return group0_inverse_cdf
+    if len(distribution) == 2:
+        return group1_inverse_cdf
+    raise ValueError(f"service time distribution {distribution!r} needs 2 or 3 parameters")
+
+
+## Job sources are iterators over the arriving jobs. They are classes rather than generators
+# so that a checkpoint can pickle them together with the rest of the simulation state
+class RandomJobSource:
+    def __init__(self, generate_variable):
+        self.generate_variable = generate_variable
+        self.current_time = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        generate_variable = self.generate_variable
+        arrival_random = generate_variable.arrival_random
+        self.current_time += arrival_random.expovariate(generate_variable.lamb) * \
+            arrival_random.uniform(generate_variable.a2l, generate_variable.a2u)
+        if self.current_time >= generate_variable.time_end:
+            raise StopIteration
+        job_class = generate_variable.generate_job_class()
+        return Job(self.current_time, generate_variable.generate_class_service_time(job_class), job_class)
+
+
+class NumpyJobSource:
+    def __init__(self, generate_variable, batch_size):
+        self.generate_variable = generate_variable
+        self.batch_size = batch_size
+        self.current_time = 0
+        # The current batch as lists, and the position of the next job in it
+        self.batch = ([], [], [])
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while self.index == len(self.batch[0]):
+            if not self.next_batch():
+                raise StopIteration
+        index = self.index
+        self.index += 1
+        return Job(self.batch[0][index], self.batch[1][index], self.batch[2][index])
+
+    def next_batch(self):
+        # Draw the next batch, False once time_end has been passed
+        import numpy as np
+        generate_variable = self.generate_variable
+        if self.current_time >= generate_variable.time_end:
+            return False
+        rng = generate_variable.arrival_rng
+        inter_arrival_times = rng.exponential(1 / generate_variable.lamb, self.batch_size) * \
+            rng.uniform(generate_variable.a2l, generate_variable.a2u, self.batch_size)
+        arrival_times = self.current_time + np.cumsum(inter_arrival_times)
+        self.current_time = arrival_times[-1]
+        arrival_times = arrival_times[:np.searchsorted(arrival_times, generate_variable.time_end)]
+        server_groups, service_times = generate_variable.generate_service_arrays(len(arrival_times))
+        self.batch = (arrival_times.tolist(), service_times.tolist(), server_groups.tolist())
+        self.index = 0
+        return True
+
+    def iter_batches(self):
+        # The remaining jobs as (arrival times, service times, classes) lists without creating Job objects
+        while self.index < len(self.batch[0]) or self.next_batch():
+            yield tuple(column[self.index:] for column in self.batch)
+            self.index = len(self.batch[0])
+
+
+class TraceJobSource:
+    def __init__(self, interarrival, service):
+        self.interarrival = interarrival
+        self.service = service
+        self.arrival_time = 0
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.index >= min(len(self.interarrival), len(self.service)):
+            raise StopIteration
+        self.arrival_time += self.interarrival[self.index]
+        service_time, server_group = self.service[self.index]
+        self.index += 1
+        return Job(self.arrival_time, service_time, server_group)
+
+
+class BinaryTraceJobSource:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.index = 0
+        self.columns = None
+
+    def __getstate__(self):
+        # The memory map is opened again after a resume
+        return {'file_path': self.file_path, 'index': self.index, 'columns': None}
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.columns is None:
+            self.columns = read_binary_trace(self.file_path)
+        arrival_times, service_times, job_classes = self.columns
+        index = self.index
+        if index >= len(arrival_times):
+            raise StopIteration
+        self.index += 1
+        return Job(arrival_times[index], service_times[index], job_classes[index])
+
+
+class Policy:
+    # Default policy: class k jobs go to farm k (the last farm if there are fewer farms than classes), the lowest
+    # index idle server is used, and a job cut at the time limit of farm k is sent to farm k + 1 to be served
+    # again from the start
+    name = 'default'
+
+    def select_farm(self, simulation_manager, job):
+        return min(job.server_type, len(simulation_manager.server_farms) - 1)
+
+    def select_server(self, simulation_manager, farm):
+        # Index of the idle server to use, the farm has at least one
+        return heapq.heappop(simulation_manager.idle_servers[farm])
+
+    def reroute(self, simulation_manager, job, server):
+        # Called when server has cut job at its time limit, the job then arrives again
+        job.is_rerouted = True
+        job.server_type = server.server_type + 1
+
+
+class ShortestQueuePolicy(Policy):
+    # Join the shortest queue: a farm with an idle server, otherwise the farm with the fewest
+    # waiting jobs per server, ties go to the farm of the job class
+    name = 'jsq'
+
+    def select_farm(self, simulation_manager, job):
+        if job.is_rerouted:
+            return job.server_type
+        farms = [farm for farm, server_farm in enumerate(simulation_manager.server_farms) if server_farm]
+        return min(farms, key=lambda farm: (not simulation_manager.idle_servers[farm],
+                                            len(simulation_manager.server_farm_queues[farm]) /
+                                            len(simulation_manager.server_farms[farm]),
+                                            farm != job.job_class))
+
+
+class SizeBasedPolicy(Policy):
+    # Jobs up to size_threshold go to farm 0 and longer jobs to the last farm, whatever their class
+    name = 'size'
+
+    def __init__(self, size_threshold):
+        self.size_threshold = size_threshold
+
+    def select_farm(self, simulation_manager, job):
+        if job.is_rerouted:
+            return job.server_type
+        if job.service_time > self.size_threshold:
+            return len(simulation_manager.server_farms) - 1
+        return 0
+
+
+class NoRestartPolicy(Policy):
+    # A job cut at the time limit keeps the service it has received and the next farm only serves the rest
+    name = 'no-restart'
+
+    def reroute(self, simulation_manager, job, server):
+        job.served_time += server.t_limit
+        super().reroute(simulation_manager, job, server)
+
+
+POLICIES = {policy.name: policy for policy in (Policy, ShortestQueuePolicy, SizeBasedPolicy, NoRestartPolicy)}
+
+
+class Config:
+    def __init__(self, mode, n, n0, t_limit, time_end=None, interarrival=None, service=None, farms=None,
+                 weights=None):
+        self.mode = mode
+        # Total number of servers and number of servers in group 0
+        self.n = n
+        self.n0 = n0
+        self.t_limit = t_limit
+        # Only used by random mode
+        self.time_end = time_end
+        # Trace mode: list of inter-arrival times
+        # Random mode: [lamb, a2l, a2u]
+        self.interarrival = interarrival
+        # Trace mode: list of (service_time, server_group)
+        # Random mode: [p0, [alpha0, beta0, eta0], [alpha1, eta1]], or for K classes
+        # [[p0, ..., p(K-2)], distribution 0, ..., distribution K-1], the last class takes the remaining probability
+        self.service = service
+        # [num_servers, t_limit] per farm, by default n0 servers with t_limit and n - n0 servers without a limit
+        self.farms = farms
+        # Weight of each class mean response time in the objective, by default WEIGHTS
+        self.weights = weights
+        # Generate the random mode workload in numpy batches
+        self.use_numpy = False
+        # Departures before this time are left out of the mean response times
+        self.warm_up_time = 0
+        # Trace mode: binary columnar trace file read instead of interarrival and service
+        self.trace_file = None
+        # Routing, dispatch and time limit behaviour
+        self.policy = Policy()
+        # Random mode: RandomStreams of the workload, None derives them from the random module
+        self.streams = None
+        # Simulation engine, a key of ENGINES
+        self.engine = 'events'
+        # Event list of the events engine, a key of EVENT_LISTS
+        self.event_list = 'heap'
+
+    @classmethod
+    def from_folder(cls, s, config_folder='config', binary_trace=False):
+        # Optional files: farms_<s>.txt with a 'num_servers [t_limit]' line per farm, which replaces n, n0 and
+        # Tlimit of para_<s>.txt, and weights_<s>.txt with the weight of each class on one line
+        def read_lines(name):
+            with open(os.path.join(config_folder, name + '_' + s + '.txt')) as file:
+                return [line.split() for line in file if line.strip()]
+
+        def read_optional_lines(name):
+            if not os.path.exists(os.path.join(config_folder, name + '_' + s + '.txt')):
+                return None
+            return read_lines(name)
+
+        mode = read_lines('mode')[0][0]
+        para = [float(line[0]) for line in read_lines('para')]
+        farms = read_optional_lines('farms')
+        if farms is not None:
+            farms = [[int(line[0]), float(line[1]) if len(line) > 1 else inf] for line in farms]
+        weights = read_optional_lines('weights')
+        if weights is not None:
+            weights = [float(value) for value in weights[0]]
+        if mode == 'trace' and binary_trace:
+            config = cls(mode, int(para[0]), int(para[1]), para[2], farms=farms, weights=weights)
+            config.trace_file = os.path.join(config_folder, 'trace_' + s + '.bin')
+            return config
+        interarrival = read_lines('interarrival')
+        service = read_lines('service')
+        if mode == 'trace':
+            interarrival = [float(line[0]) for line in interarrival]
+            service = [(float(line[0]), int(line[1])) for line in service]
+            return cls(mode, int(para[0]), int(para[1]), para[2], interarrival=interarrival, service=service,
+                       farms=farms, weights=weights)
+        elif mode == 'random':
+            interarrival = [float(value) for value in interarrival[0]]
+            # The first line holds p0, or the probabilities of all classes but the last one
+            service = [[float(value) for value in service[0]]] + \
+                [[float(value) for value in line] for line in service[1:]]
+            return cls(mode, int(para[0]), int(para[1]), para[2], time_end=para[3], interarrival=interarrival,
+                       service=service, farms=farms, weights=weights)
+        raise ValueError(f"unknown mode {mode!r} in mode_{s}.txt")
+
+    @property
+    def num_classes(self):
+        if self.mode == 'random':
+            return len(self.service) - 1
+        if self.trace_file:
+            # Counted by convert_trace, so the class column is not scanned
+            num_classes = read_binary_trace_header(self.trace_file)[1]
+        else:
+            num_classes = max((job_class for _, job_class in self.service), default=0) + 1
+        # At least the two classes of the original model, so the output always has a class 1 mean
+        return max(2, num_classes)
+
+    def class_probabilities(self):
+        probabilities = self.service[0]
+        if not isinstance(probabilities, list):
+            probabilities = [probabilities]
+        if len(probabilities) == self.num_classes - 1:
+            probabilities = probabilities + [1 - sum(probabilities)]
+        return probabilities
+
+    def farm_layout(self):
+        # [(num_servers, t_limit)] per farm
+        if self.farms is not None:
+            return [tuple(farm) for farm in self.farms]
+        return [(self.n0, self.t_limit), (self.n - self.n0, inf)]
+
+    def with_streams(self, streams):
+        config = copy.copy(self)
+        config.streams = streams
+        return config
+
+    def with_t_limit(self, t_limit):
+        # Copy of the config with a different time limit on farm 0
+        config = copy.copy(self)
+        config.t_limit = t_limit
+        if self.farms is not None:
+            config.farms = [[self.farms[0][0], t_limit]] + self.farms[1:]
+        return config
+
+    def description(self):
+        # Everything in the config that changes the simulation results, as plain data
+        description = {'mode': self.mode, 'farms': self.farm_layout(), 'warm_up_time': self.warm_up_time,
+                       'policy': dict(vars(self.policy), name=self.policy.name)}
+        if self.mode == 'random':
+            description.update(time_end=self.time_end, interarrival=self.interarrival, service=self.service,
+                               use_numpy=self.use_numpy)
+        elif self.trace_file:
+            trace_stat = os.stat(self.trace_file)
+            description['trace_file'] = [os.path.abspath(self.trace_file), trace_stat.st_size, trace_stat.st_mtime]
+        else:
+            description.update(interarrival=self.interarrival, service=self.service)
+        return description
+
+    def objective_weights(self):
+        weights = self.weights if self.weights is not None else WEIGHTS
+        if len(weights) != self.num_classes:
+            raise ValueError(f"{len(weights)} weights given for {self.num_classes} job classes")
+        return weights
+
+    def generate_variable(self):
+        lamb, a2l, a2u = self.interarrival
+        distributions = [tuple(distribution) for distribution in self.service[1:]]
+        class_probabilities = self.class_probabilities()
+        generate_variable_class = NumpyGenerateVariable if self.use_numpy else GenerateVariable
+        if len(distributions) == 2 and len(distributions[0]) == 3 and len(distributions[1]) == 2:
+            (alpha0, beta0, eta0), (alpha1, eta1) = distributions
+            return generate_variable_class(lamb, a2l, a2u, class_probabilities[0], alpha0, beta0, eta0, alpha1, eta1,
+                                           self.time_end, streams=self.streams)
+        return generate_variable_class(lamb, a2l, a2u, time_end=self.time_end, class_probabilities=class_probabilities,
+                                       service_distributions=distributions, streams=self.streams)
+
+    def jobs(self):
+        return list(self.job_source())
+
+    def job_source(self):
+        # Iterator over the arriving jobs in arrival time order, jobs are created lazily
+        if self.mode == 'trace' and self.trace_file:
+            return BinaryTraceJobSource(self.trace_file)
+        if self.mode == 'trace':
+            return TraceJobSource(self.interarrival, self.service)
+        return self.generate_variable().iter_jobs()
+
+
+## Binary columnar trace: a header of TRACE_MAGIC, the number of jobs N and the number of classes (1 + the
+# largest class in the trace, little-endian uint64 each), then the columns arrival time (N float64), service
+# time (N float64) and class (N int8)
+TRACE_MAGIC = b'SFTRACE2'
+TRACE_HEADER = struct.Struct('<8sQQ')
+
+
+def read_binary_trace_header(file_path):
+    # (number of jobs, number of classes) of a binary trace file
+    with open(file_path, 'rb') as file:
+        header = file.read(TRACE_HEADER.size)
+    if len(header) < TRACE_HEADER.size or header[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+        raise ValueError(f"{file_path} is not a binary trace file, convert the trace again with --convert-trace")
+    return TRACE_HEADER.unpack(header)[1:]
+
+
+def read_binary_trace(file_path):
+    # Zero-copy memoryviews over a memory map of the file; the map stays open while a view is alive
+    num_jobs = read_binary_trace_header(file_path)[0]
+    with open(file_path, 'rb') as file:
+        trace_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    # 8 + 8 + 1 bytes per job
+    file_size = len(trace_map)
+    if file_size != TRACE_HEADER.size + 17 * num_jobs:
+        trace_map.close()
+        raise ValueError(f"{file_path} is not a binary trace file, it has {file_size} bytes instead of the "
+                         f"{TRACE_HEADER.size + 17 * num_jobs} of {num_jobs} jobs")
+    view = memoryview(trace_map)
+    offset = TRACE_HEADER.size
+    arrival_times = view[offset:offset + 8 * num_jobs].cast('d')
+    offset += 8 * num_jobs
+    service_times = view[offset:offset + 8 * num_jobs].cast('d')
+    offset += 8 * num_jobs
+    job_classes = view[offset:offset + num_jobs].cast('b')
+    return arrival_times, service_times, job_classes
+
+
+def convert_trace(s, config_folder='config', chunk_size=1 << 16):
+    # Write config/trace_<s>.bin from interarrival_<s>.txt and service_<s>.txt. The text files are read
+    # line by line and the columns are collected in temporary files, so memory does not grow with the trace
+    with open(os.path.join(config_folder, 'mode_' + s + '.txt')) as file:
+        mode = file.read().strip()
+    if mode != 'trace':
+        raise ValueError(f"test {s} is in {mode!r} mode, only trace mode configs can be converted")
+    trace_file = os.path.join(config_folder, 'trace_' + s + '.bin')
+    # Removed by the operating system when closed, also after an error
+    column_files = [tempfile.TemporaryFile() for _ in range(3)]
+    columns = [array('d'), array('d'), array('b')]
+    num_jobs = 0
+    num_classes = 0
+    arrival_time = 0
+    with open(os.path.join(config_folder, 'interarrival_' + s + '.txt')) as interarrival_file, \
+            open(os.path.join(config_folder, 'service_' + s + '.txt')) as service_file:
+        # Blank lines are skipped in each file on its own, as Config.from_folder does, so the nth job takes
+        # the nth non-blank line of both files
+        interarrival_lines = (line for line in interarrival_file if line.strip())
+        service_lines = (line for line in service_file if line.strip())
+        for interarrival_line, service_line in zip(interarrival_lines, service_lines):
+            service_time, job_class = service_line.split()
+            arrival_time += float(interarrival_line)
+            columns[0].append(arrival_time)
+            columns[1].append(float(service_time))
+            columns[2].append(int(job_class))
+            num_classes = max(num_classes, columns[2][-1] + 1)
+            num_jobs += 1
+            if len(columns[0]) == chunk_size:
+                for column, column_file in zip(columns, column_files):
+                    column.tofile(column_file)
+                    del column[:]
+    with open(trace_file, 'wb') as file:
+        file.write(TRACE_HEADER.pack(TRACE_MAGIC, num_jobs, num_classes))
+        for column, column_file in zip(columns, column_files):
+            column.tofile(column_file)
+            column_file.seek(0)
+            shutil.copyfileobj(column_file, file)
+            column_file.close()
+    return trace_file
+
+
+class FarmQueue:
+    def __init__(self):
+        self.jobs = deque()
+        ## Queue length statistics
+        # Integral of the queue length over time, up to last_change_time
+        self.length_time_area = 0
+        self.last_change_time = 0
+        self.max_length = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __iter__(self):
+        return iter(self.jobs)
+
+    def _update_area(self, current_time):
+        self.length_time_area += len(self.jobs) * (current_time - self.last_change_time)
+        self.last_change_time = current_time
+
+    def enqueue(self, job, current_time):
+        self._update_area(current_time)
+        self.jobs.append(job)
+        if len(self.jobs) > self.max_length:
+            self.max_length = len(self.jobs)
+
+    def dequeue(self, current_time):
+        self._update_area(current_time)
+        return self.jobs.popleft()
+
+    def mean_length(self, current_time):
+        if current_time <= 0:
+            return 0
+        return (self.length_time_area + len(self.jobs) * (current_time - self.last_change_time)) / current_time
+
+
+class ResponseTimeWindows:
+    # Mean response time per class of the jobs departing in each window of simulation time
+    def __init__(self, window_width, num_classes=2):
+        self.window_width = window_width
+        self.sums = [[] for _ in range(num_classes)]
+        self.counts = [[] for _ in range(num_classes)]
+
+    def add(self, job, current_time):
+        if job.is_rerouted:
+            return
+        sums = self.sums[job.job_class]
+        counts = self.counts[job.job_class]
+        index = int(current_time // self.window_width)
+        while len(sums) <= index:
+            sums.append(0)
+            counts.append(0)
+        sums[index] += job.finish_time - job.arrival_time
+        counts[index] += 1
+
+
+class ResponseTimeHistogram:
+    # Log-bucketed histogram of response times (as in DDSketch): bucket i counts the values in
+    # (gamma^(i-1), gamma^i], so a quantile is returned within relative_accuracy of the true value while
+    # the number of buckets only grows with the logarithm of the range of the values. Histograms with the
+    # same accuracy are merged by adding their counts, e.g. over replications
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = log(self.gamma)
+        self.counts = {}
+        # Values of 0, which have no bucket
+        self.zero_count = 0
+        self.count = 0
+        self.min = inf
+        self.max = 0
+
+    def add(self, value):
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = ceil(log(value) / self.log_gamma)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("only histograms with the same relative accuracy can be merged")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
 
-    def _generate_group1_service_time(self):
-        while True:
-            t = random.uniform(self.alpha1, 10)
-            probability_density = self.eta1 / (self.alpha1 ** -self.eta1) * (t ** (self.eta1 - 1))
-            if random.random() < probability_density / 10:
-                return t
+    def quantile(self, q):
+        # 0 for an empty histogram, like the mean response time of a class without completed jobs
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                # The middle of the bucket in relative terms, within the observed range
+                return min(max(2 * self.gamma ** index / (self.gamma + 1), self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'relative_accuracy': self.relative_accuracy, 'counts': self.counts, 'zero_count': self.zero_count,
+                'count': self.count, 'min': self.min if self.count else None, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, state):
+        histogram = cls(state['relative_accuracy'])
+        histogram.counts = {int(index): count for index, count in state['counts'].items()}
+        histogram.zero_count = state['zero_count']
+        histogram.count = state['count']
+        histogram.min = state['min'] if state['min'] is not None else inf
+        histogram.max = state['max']
+        return histogram
+
+
+def histogram_label(index, num_classes):
+    # Histograms 0 .. K-1 are the classes, K .. 2K-1 the rerouted jobs of each class, labelled as in the dep file
+    return str(index) if index < num_classes else 'r' + str(index - num_classes)
+
+
+class Tracer:
+    OFF = 'off'
+    # Only the end of run summary
+    SUMMARY = 'summary'
+    # Every Nth event plus the summary
+    SAMPLED = 'sampled'
+    # Every event plus the summary
+    FULL = 'full'
+    LEVELS = (OFF, SUMMARY, SAMPLED, FULL)
+    FORMATS = ('text', 'csv', 'jsonl')
+
+    def __init__(self, level=OFF, every=1, sink=None, record_format='text', buffer_size=1000):
+        if level not in self.LEVELS:
+            raise ValueError(f"unknown trace level {level!r}")
+        if record_format not in self.FORMATS:
+            raise ValueError(f"unknown trace format {record_format!r}")
+        if every < 1:
+            raise ValueError(f"every must be at least 1, not {every}")
+        self.level = level
+        self.every = every if level == self.SAMPLED else 1
+        # sink is a file path, an open file-like object or None for an in-memory trace
+        self.sink = sink
+        self.file = None
+        self.record_format = record_format
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.lines = []
+        self.num_events = 0
+        self.csv_columns = None
+
+    @property
+    def traces_events(self):
+        return self.level in (self.SAMPLED, self.FULL)
+
+    def open(self):
+        if isinstance(self.sink, str):
+            self.file = open(self.sink, 'w')
+        else:
+            self.file = self.sink
+
+    def on_event(self, simulation_manager):
+        self.num_events += 1
+        if self.num_events % self.every:
+            return
+        if self.record_format == 'text':
+            self.write(simulation_manager.format_state())
+        else:
+            self.write_record(simulation_manager.event_record())
+
+    def write_record(self, record):
+        if self.record_format == 'jsonl':
+            self.write(json.dumps(record))
+            return
+        if self.csv_columns is None:
+            self.csv_columns = list(record)
+            self.write(','.join(self.csv_columns))
+        self.write(','.join(str(record[column]) for column in self.csv_columns))
+
+    def write_csv_summary(self, summary):
+        # The summary has columns of its own, so it is kept out of the event table: a trace file trace.csv gets
+        # a trace_summary.csv next to it, other sinks get the summary table after a blank line
+        lines = [','.join(summary), ','.join(str(value) for value in summary.values())]
+        if isinstance(self.sink, str):
+            root, ext = os.path.splitext(self.sink)
+            with open(root + '_summary' + ext, 'w') as file:
+                file.write('\n'.join(lines) + '\n')
+            return
+        if self.csv_columns is not None:
+            self.write('')
+        for line in lines:
+            self.write(line)
+
+    def write(self, line):
+        self.buffer.append(line)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.file is None:
+            self.lines.extend(self.buffer)
+        else:
+            self.file.write('\n'.join(self.buffer) + '\n')
+        self.buffer = []
+
+    def close(self, simulation_manager):
+        if self.level != self.OFF:
+            summary = {'events': simulation_manager.num_events, 'end_time': simulation_manager.current_time}
+            for job_class, num_jobs in enumerate(simulation_manager.n):
+                summary[f'n{job_class}'] = num_jobs
+            for job_class, mean_response_time in enumerate(simulation_manager.mean_response_times()):
+                summary[f'mrt{job_class}'] = mean_response_time
+            for index, (mean_length, max_length) in enumerate(simulation_manager.queue_statistics()):
+                summary[f'mean_queue_{index}'] = mean_length
+                summary[f'max_queue_{index}'] = max_length
+            if self.record_format == 'jsonl':
+                self.write(json.dumps({'summary': summary}))
+            elif self.record_format == 'csv':
+                self.write_csv_summary(summary)
+            else:
+                self.write('summary: ' + ' '.join(f'{key}={value}' for key, value in summary.items()))
+        self.flush()
+        if isinstance(self.sink, str):
+            self.file.close()
+        elif self.file is not None:
+            self.file.flush()
+
+
+# Bumped whenever the pickled SimulationManager state changes
+CHECKPOINT_VERSION = 5
+# Bumped whenever a change to the engines changes the simulation results, so cached results are not reused
+ENGINE_VERSION = 2
+
+
+class FarmMetrics:
+    # Time series per farm in fixed windows of simulation time: utilisation (busy servers integrated over time,
+    # per server available), time-weighted mean queue length, arrivals (rerouted jobs included), completions and
+    # jobs killed at the time limit. Each window is written as soon as it ends, so memory does not grow with the
+    # length of the run. The busy time of every server over the whole run is written at the end
+    COLUMNS = ('window_start', 'farm', 'utilisation', 'mean_queue', 'arrivals', 'completions', 'kills')
+    # Utilisation from which a farm counts as saturated
+    SATURATION = 0.95
+
+    def __init__(self, window_width, sink=None, server_sink=None):
+        self.window_width = window_width
+        # File paths of the window table and the server table, None keeps the rows in memory
+        self.sink = sink
+        self.server_sink = server_sink
+        self.file = None
+        self.rows = []
+        self.server_rows = []
+        self.window = 0
+        self.start_time = 0
+        self.last_time = 0
+        self.num_finished = 0
+        self.server_busy_time = []
+        # Whole run per farm: busy server time and start of the first saturated window
+        self.total_busy_area = []
+        self.saturation_time = []
+
+    def open(self, simulation_manager):
+        num_farms = len(simulation_manager.server_farms)
+        self.start_time = self.last_time = simulation_manager.current_time
+        self.window = int(self.start_time // self.window_width)
+        self.reset_window(num_farms)
+        self.server_busy_time = [[0] * len(server_farm) for server_farm in simulation_manager.server_farms]
+        self.total_busy_area = [0] * num_farms
+        self.saturation_time = [None] * num_farms
+        if self.sink is not None:
+            self.file = open(self.sink, 'w')
+        self.write_row(self.COLUMNS)
+
+    def reset_window(self, num_farms):
+        self.busy_area = [0] * num_farms
+        self.queue_area = [0] * num_farms
+        self.arrivals = [0] * num_farms
+        self.completions = [0] * num_farms
+        self.kills = [0] * num_farms
+
+    def write_row(self, row):
+        if self.file is None:
+            self.rows.append(row)
+        else:
+            self.file.write(' '.join(row) + '\n')
+
+    def advance(self, simulation_manager, end_time):
+        # Integrate the busy servers and queue lengths up to end_time, called before every event
+        self.num_finished = len(simulation_manager.finished_jobs)
+        while self.last_time < end_time:
+            window_end = (self.window + 1) * self.window_width
+            time = min(end_time, window_end)
+            duration = time - self.last_time
+            for farm, server_farm in enumerate(simulation_manager.server_farms):
+                self.busy_area[farm] += (len(server_farm) - len(simulation_manager.idle_servers[farm])) * duration
+                self.queue_area[farm] += len(simulation_manager.server_farm_queues[farm]) * duration
+            self.last_time = time
+            if end_time >= window_end:
+                self.end_window(simulation_manager, self.window_width)
+                self.window += 1
+
+    def on_event(self, simulation_manager):
+        # Count the event just processed
+        _, event_type, _, job, server = simulation_manager.current_event
+        if event_type == ARRIVAL:
+            self.arrivals[job.server_type] += 1
+            return
+        farm = server.server_type
+        if len(simulation_manager.finished_jobs) > self.num_finished:
+            self.completions[farm] += 1
+            self.server_busy_time[farm][server.index] += simulation_manager.current_time - job.start_time
+        else:
+            # Killed at the time limit and already arrived at its next farm
+            self.kills[farm] += 1
+            self.arrivals[job.server_type] += 1
+            self.server_busy_time[farm][server.index] += server.t_limit
+
+    def end_window(self, simulation_manager, duration):
+        window_start = self.window * self.window_width
+        for farm, server_farm in enumerate(simulation_manager.server_farms):
+            utilisation = self.busy_area[farm] / (len(server_farm) * duration) if server_farm else 0
+            if utilisation >= self.SATURATION and self.saturation_time[farm] is None:
+                self.saturation_time[farm] = window_start
+            self.total_busy_area[farm] += self.busy_area[farm]
+            self.write_row((f'{window_start:.4f}', str(farm), f'{utilisation:.4f}',
+                            f'{self.queue_area[farm] / duration:.4f}', str(self.arrivals[farm]),
+                            str(self.completions[farm]), str(self.kills[farm])))
+        self.reset_window(len(simulation_manager.server_farms))
+
+    def close(self, simulation_manager):
+        self.advance(simulation_manager, simulation_manager.current_time)
+        # The last window ends with the run
+        duration = self.last_time - self.window * self.window_width
+        if duration > 0:
+            self.end_window(simulation_manager, duration)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        # Jobs still in service count up to the end of the run
+        run_time = self.last_time - self.start_time
+        for farm, server_farm in enumerate(simulation_manager.server_farms):
+            for server in server_farm:
+                if server.is_busy:
+                    self.server_busy_time[farm][server.index] += self.last_time - server.current_job.start_time
+        self.server_rows = [('farm', 'server', 'busy_time', 'utilisation')]
+        for farm, busy_times in enumerate(self.server_busy_time):
+            for index, busy_time in enumerate(busy_times):
+                self.server_rows.append((str(farm), str(index), f'{busy_time:.4f}',
+                                         f'{busy_time / run_time if run_time else 0:.4f}'))
+        if self.server_sink is not None:
+            with open(self.server_sink, 'w') as file:
+                file.write(''.join(' '.join(row) + '\n' for row in self.server_rows))
+
+    def report(self):
+        run_time = self.last_time - self.start_time
+        lines = []
+        for farm, busy_times in enumerate(self.server_busy_time):
+            utilisation = self.total_busy_area[farm] / (len(busy_times) * run_time) if busy_times and run_time else 0
+            saturation_time = self.saturation_time[farm]
+            saturation = f"from time {saturation_time:.4f}" if saturation_time is not None else "never"
+            lines.append(f"farm {farm}: utilisation {utilisation:.4f}, "
+                         f"saturated (>= {self.SATURATION:.0%} busy) {saturation}")
+        return '\n'.join(lines)
+
+
+class Instrumentation:
+    # Counters and timers for one SimulationManager. attach() wraps the hot-path methods on the
+    # instance only, so a SimulationManager without instrumentation runs the plain methods
+    def __init__(self):
+        self.events = {'arrival': 0, 'departure': 0}
+        self.max_heap_size = 0
+        self.reroutes = 0
+        self.handler_time = {'arrival': 0, 'departure': 0, 'generation': 0}
+
+    def attach(self, simulation_manager):
+        process_next_event = simulation_manager.process_next_event
+        handle_arrival = simulation_manager.handle_arrival
+        handle_departure = simulation_manager.handle_departure
+        schedule_next_arrival = simulation_manager.schedule_next_arrival
+        perf_counter = time.perf_counter
+
+        def counted_process_next_event():
+            num_pending = len(simulation_manager.event_queue)
+            if num_pending > self.max_heap_size:
+                self.max_heap_size = num_pending
+            if not process_next_event():
+                return False
+            self.events[EVENT_NAMES[simulation_manager.current_event[1]]] += 1
+            return True
+
+        def timed_handle_arrival(job):
+            start = perf_counter()
+            handle_arrival(job)
+            self.handler_time['arrival'] += perf_counter() - start
+
+        def timed_handle_departure(job, server):
+            was_rerouted = job.is_rerouted
+            start = perf_counter()
+            handle_departure(job, server)
+            self.handler_time['departure'] += perf_counter() - start
+            if job.is_rerouted and not was_rerouted:
+                self.reroutes += 1
+
+        def timed_schedule_next_arrival():
+            start = perf_counter()
+            schedule_next_arrival()
+            self.handler_time['generation'] += perf_counter() - start
+
+        simulation_manager.process_next_event = counted_process_next_event
+        simulation_manager.handle_arrival = timed_handle_arrival
+        simulation_manager.handle_departure = timed_handle_departure
+        simulation_manager.schedule_next_arrival = timed_schedule_next_arrival
+        return self
+
+    def report(self):
+        # Handler times are inclusive: a departure that reroutes a job also counts the arrival it triggers
+        lines = [f"events: {self.events['arrival']} arrivals, {self.events['departure']} departures",
+                 f"event list high-water mark: {self.max_heap_size}",
+                 f"rerouted at a time limit: {self.reroutes}"]
+        lines += [f"time in {name}: {seconds:.6f}s" for name, seconds in self.handler_time.items()]
+        return '\n'.join(lines)
 
 
 class SimulationManager:
     def __init__(self):
         self.current_time = 0
-        self.current_event = Event(None, None, None)
-        self.event_queue = []
+        self.current_event = (None, None, None, None, None)
+        self.event_queue = HeapEventList()
         self.server_farms = []
         self.finished_jobs = []
-        self.server_farm_queues = [[], []]
-        self.T0 = 0
-        self.T1 = 0
-        self.n0 = 0
-        self.n1 = 0
+        self.server_farm_queues = [FarmQueue(), FarmQueue()]
+        # Cumulative response time and number of completed jobs per class
+        self.T = [0, 0]
+        self.n = [0, 0]
+        self.num_classes = 2
+        # Response time histogram per class, then per class for the rerouted jobs
+        self.histograms = [ResponseTimeHistogram() for _ in range(4)]
         self.response_time_cumulative = 0
+        self.num_events = 0
+        self.tracer = None
+        self.farm_metrics = None
+        self.idle_servers = [[], []]
+        self.job_source = iter(())
+        self.next_arrival_job = None
+        self.warm_up_time = 0
+        self.response_time_windows = None
+        self.policy = Policy()
+        # Save a checkpoint to checkpoint_file every checkpoint_interval units of simulation time
+        self.checkpoint_file = None
+        self.checkpoint_interval = inf
+
+    def setup_server_farms(self, n, n0, t_limit):
+        self.setup_farms([(n0, t_limit), (n - n0, inf)])
+
+    def setup_farms(self, farm_layout, num_classes=2):
+        # farm_layout is [(num_servers, t_limit)] per farm. A job cut at a time limit moves on to the next farm,
+        # so the last farm must not have one
+        if isfinite(farm_layout[-1][1]):
+            raise ValueError("the last farm cannot have a time limit")
+        self.server_farms = [[Server(farm, t_limit, index) for index in range(num_servers)]
+                             for farm, (num_servers, t_limit) in enumerate(farm_layout)]
+        self.server_farm_queues = [FarmQueue() for _ in farm_layout]
+        # Heaps of idle server indices per farm, so the lowest index idle server is used first
+        self.idle_servers = [list(range(len(server_farm))) for server_farm in self.server_farms]
+        self.T = [0] * num_classes
+        self.n = [0] * num_classes
+        self.num_classes = num_classes
+        self.histograms = [ResponseTimeHistogram() for _ in range(2 * num_classes)]
+
+    def add_jobs(self, jobs):
+        for job in jobs:
+            self.event_queue.push(job.arrival_time, ARRIVAL, job)
+
+    def set_job_source(self, job_source):
+        # Only the next arrival of the source is kept in the event queue
+        self.job_source = iter(job_source)
+        self.schedule_next_arrival()
+
+    def schedule_next_arrival(self):
+        self.next_arrival_job = next(self.job_source, None)
+        if self.next_arrival_job is not None:
+            self.event_queue.push(self.next_arrival_job.arrival_time, ARRIVAL, self.next_arrival_job)
 
     def process_next_event(self):
         if not self.event_queue:
             return False
-        event = heapq.heappop(self.event_queue)
+        event = self.event_queue.pop()
         self.current_event = event
-        self.current_time = event.event_time
-        if event.event_type == 'arrival':
-            self.handle_arrival(event.job)
-        elif event.event_type == 'departure':
-            self.handle_departure(event.job)
+        event_time, event_type, _, job, server = event
+        self.current_time = event_time
+        self.num_events += 1
+        if event_type == DEPARTURE:
+            self.handle_departure(job, server)
+        else:
+            if job is self.next_arrival_job:
+                self.schedule_next_arrival()
+            self.handle_arrival(job)
         return True
 
     def handle_arrival(self, job):
-        server_farm = self.server_farms[0] if job.server_type == 0 else self.server_farms[1]
-        job.start_time = self.current_time
-        for server in server_farm:
-            if not server.is_busy:
-                server.assign_job(job, self.current_time)
-                heapq.heappush(self.event_queue, Event(job.finish_time, 'departure', job))
-                break
-        else:
-            if job.server_type == 0:
-                self.server_farm_queues[0].append(job)
-            elif job.server_type == 1:
-                self.server_farm_queues[1].append(job)
-
-    def handle_departure(self, job):
-        t_limit = None
-        server_farm = self.server_farms[0] if job.server_type == 0 else self.server_farms[1]
-        for server in server_farm:
-            if server.current_job == job:
-                server.is_busy = False
-                server.current_job = None
-                t_limit = server.t_limit
-                break
-        self.finished_jobs.append(job)
-        if job.server_type == 0:
-            self.T0 += job.finish_time - job.start_time
-            self.n0 += 1
-        elif job.server_type == 1:
-            self.T1 += job.finish_time - job.start_time
-            self.n1 += 1
-        if job.server_type == 0 and self.server_farm_queues[0]:
-            self.handle_arrival(self.server_farm_queues[0].pop(0))
-        elif job.server_type == 1 and self.server_farm_queues[1]:
-            self.handle_arrival(self.server_farm_queues[1].pop(0))
-        if job.service_time > t_limit and job.server_type == 0:
-            job.server_type = 1
+        farm = self.policy.select_farm(self, job)
+        job.server_type = farm
+        if self.idle_servers[farm]:
+            self.start_service(self.server_farms[farm][self.policy.select_server(self, farm)], job)
+        else:
+            self.server_farm_queues[farm].enqueue(job, self.current_time)
+
+    def start_service(self, server, job):
+        server.assign_job(job, self.current_time)
+        self.event_queue.push(job.finish_time, DEPARTURE, job, server)
+
+    def handle_departure(self, job, server):
+        server.is_busy = False
+        server.current_job = None
+        # A job that hits the time limit is killed and sent to the next farm, it finally leaves as a
+        # rerouted job and is not counted in the mean response time of its class
+        is_killed = server.cuts(job)
+        if not is_killed:
+            self.finished_jobs.append(job)
+            if self.response_time_windows is not None:
+                self.response_time_windows.add(job, self.current_time)
+            if self.current_time >= self.warm_up_time:
+                response_time = job.finish_time - job.arrival_time
+                self.histograms[job.job_class + self.num_classes * job.is_rerouted].add(response_time)
+                if not job.is_rerouted:
+                    self.T[job.job_class] += response_time
+                    self.n[job.job_class] += 1
+        # Every other server of the farm is busy while its queue is not empty,
+        # so the freed server goes straight to the first waiting job
+        if self.server_farm_queues[server.server_type]:
+            self.start_service(server, self.server_farm_queues[server.server_type].dequeue(self.current_time))
+        else:
+            heapq.heappush(self.idle_servers[server.server_type], server.index)
+        if is_killed:
+            self.policy.reroute(self, job, server)
             self.handle_arrival(job)
 
+    def queue_statistics(self):
+        # (time-weighted mean length, max length) per farm queue
+        return [(server_farm_queue.mean_length(self.current_time), server_farm_queue.max_length)
+                for server_farm_queue in self.server_farm_queues]
+
+    def mean_response_times(self):
+        # Per class, 0 for a class without completed jobs
+        return [T / n if n else 0 for T, n in zip(self.T, self.n)]
+
+    def run_until(self, end_time):
+        # Process the events up to end_time, later events stay in the queue
+        event_queue = self.event_queue
+        next_time = event_queue.next_time
+        tracer = self.tracer
+        if tracer is not None and not tracer.traces_events:
+            tracer = None
+        farm_metrics = self.farm_metrics
+        if tracer is not None or farm_metrics is not None:
+            while event_queue and next_time() <= end_time:
+                if farm_metrics is not None:
+                    farm_metrics.advance(self, next_time())
+                self.process_next_event()
+                if farm_metrics is not None:
+                    farm_metrics.on_event(self)
+                if tracer is not None:
+                    tracer.on_event(self)
+        else:
+            while event_queue and next_time() <= end_time:
+                self.process_next_event()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The tracer, the farm metrics and the instrumentation wrappers hold open files and closures,
+        # they are not checkpointed
+        for name in ('process_next_event', 'handle_arrival', 'handle_departure', 'schedule_next_arrival'):
+            state.pop(name, None)
+        state['tracer'] = None
+        state['farm_metrics'] = None
+        return state
+
+    def save_checkpoint(self, file_path):
+        # Written to a temporary file first so a crash while saving keeps the previous checkpoint
+        temporary_path = file_path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            pickle.dump((CHECKPOINT_VERSION, random.getstate(), self), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, file_path)
+
+    @staticmethod
+    def load_checkpoint(file_path):
+        with open(file_path, 'rb') as file:
+            version, random_state, simulation_manager = pickle.load(file)
+        if version != CHECKPOINT_VERSION:
+            raise ValueError(f"{file_path} is a version {version} checkpoint, expected {CHECKPOINT_VERSION}")
+        random.setstate(random_state)
+        return simulation_manager
+
+    def run_config(self, config):
+        self.event_queue = EVENT_LISTS[config.event_list]()
+        self.setup_farms(config.farm_layout(), config.num_classes)
+        self.policy = config.policy
+        self.warm_up_time = config.warm_up_time
+        self.set_job_source(config.job_source())
+        self.run_events()
+
+    def run_events(self):
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.open()
+        if self.farm_metrics is not None:
+            self.farm_metrics.open(self)
+        if self.checkpoint_file is None:
+            self.run_until(inf)
+        else:
+            next_checkpoint_time = self.current_time + self.checkpoint_interval
+            while self.event_queue:
+                self.run_until(next_checkpoint_time)
+                self.save_checkpoint(self.checkpoint_file)
+                if self.event_queue:
+                    # Intervals without events are skipped: the next checkpoint is at the first interval end
+                    # that the next event does not come after
+                    next_checkpoint_time += self.checkpoint_interval * ceil(
+                        (self.event_queue.next_time() - next_checkpoint_time) / self.checkpoint_interval)
+        if tracer is not None:
+            tracer.close(self)
+        if self.farm_metrics is not None:
+            self.farm_metrics.close(self)
+
+    def write_output(self, s, out_folder='output'):
+        write_mrt(s, self.mean_response_times(), out_folder)
+        write_quantiles(s, self.histograms, out_folder)
+        if isinstance(self.finished_jobs, DepartureWriter):
+            # The dep file has been written during the run
+            self.finished_jobs.close()
+            return
+        with open(os.path.join(out_folder, 'dep_' + s + '.txt'), 'w') as file:
+            for job in sorted(self.finished_jobs, key=lambda finished_job: finished_job.finish_time):
+                job_class = 'r' + str(job.job_class) if job.is_rerouted else str(job.job_class)
+                file.write(f'{job.arrival_time:.4f} {job.finish_time:.4f} {job_class} \n')
+
     def run(self):
         input_mode = input("please select mode: \n 1.trace mode \n 2.random mode")
         if input_mode == '1':
             print('---- run trace mode ----')
             t_limit = 3
-            self.server_farms = [[Server(0, t_limit)], [Server(1, inf), Server(1, inf)]]
+            self.setup_server_farms(3, 1, t_limit)
             jobs = [Job(2, 5, 1), Job(10, 4, 0), Job(11, 9, 0), Job(12, 2, 0), Job(14, 8, 1), Job(15, 5, 0),
                     Job(19, 3, 0), Job(20, 6, 1)]
-            for job in jobs:
-                heapq.heappush(self.event_queue, Event(job.arrival_time, 'arrival', job))
-            while self.process_next_event():
-                self.print()
-                pass
+            self.add_jobs(jobs)
+            self.tracer = Tracer(Tracer.FULL, sink=sys.stdout)
+            self.run_events()
         elif input_mode == '2':
             print('---- run random mode ----')
             generate_variable = GenerateVariable()
@@ -185,43 +1525,795 @@ class SimulationManager:
             # print(generate_variable.arrival_times)
             # print(generate_variable.service_times)
             t_limit = 3.3
-            self.server_farms = [[Server(0, t_limit)], [Server(1, inf), Server(1, inf)]]
+            self.setup_server_farms(3, 1, t_limit)
             jobs = []
             for index, arrival_time in enumerate(arrival_times):
                 job = Job(arrival_time, service_times[index][1], service_times[index][0])
                 jobs.append(job)
-            for job in jobs:
-                heapq.heappush(self.event_queue, Event(job.arrival_time, 'arrival', job))
-            while self.process_next_event():
-                self.print()
-                pass
-            w0 = 0.83
-            w1 = 0.059
-            self.response_time_cumulative = w0 * self.T0 / self.n0 + w1 * self.T1 / self.n1
+            self.add_jobs(jobs)
+            self.tracer = Tracer(Tracer.FULL, sink=sys.stdout)
+            self.run_events()
+            self.response_time_cumulative = sum(weight * T / n for weight, T, n in zip(WEIGHTS, self.T, self.n))
             print("response_time_cumulative T:", self.response_time_cumulative)
 
-    def print(self):
-        print()
-        print("MasterClock:", self.current_time, end="; ")
-        print(self.current_event.event_type, end="; ")
+    def format_state(self):
+        text = f"MasterClock: {self.current_time}; {EVENT_NAMES.get(self.current_event[1])}; "
         for index, server_farm in enumerate(self.server_farms):
-            print(f"serverGroup:{index}", end=" ")
-            for index_server, server in enumerate(self.server_farms[index]):
-                print(f"server_index{index_server}", end="; ")
+            text += f"serverGroup:{index} "
+            for index_server, server in enumerate(server_farm):
+                text += f"server_index{index_server}; "
                 if server.is_busy:
-                    print("busy", end="; ")
-                    print(f"({server.current_job.arrival_time},{server.current_job.finish_time})", end="; ")
+                    text += f"busy; ({server.current_job.arrival_time},{server.current_job.finish_time}); "
                 else:
-                    print("Idle", end="; ")
+                    text += "Idle; "
         for index, server_farm_queue in enumerate(self.server_farm_queues):
-            print(f"Queue {index}:", end=" ")
-            if self.server_farm_queues[index]:
-                for job in self.server_farm_queues[index]:
-                    print(f"({job.arrival_time},{job.service_time})", end="; ")
+            text += f"Queue {index}: "
+            if server_farm_queue:
+                for job in server_farm_queue:
+                    text += f"({job.arrival_time},{job.service_time}); "
             else:
-                print("NULL", end=" ")
+                text += "NULL "
+        return text
 
+    def event_record(self):
+        job = self.current_event[3]
+        record = {'time': self.current_time, 'event': EVENT_NAMES[self.current_event[1]],
+                  'arrival_time': job.arrival_time, 'service_time': job.service_time,
+                  'job_class': 'r' + str(job.job_class) if job.is_rerouted else job.job_class,
+                  'server_type': job.server_type}
+        for index, server_farm in enumerate(self.server_farms):
+            record[f'busy_{index}'] = sum(server.is_busy for server in server_farm)
+        for index, server_farm_queue in enumerate(self.server_farm_queues):
+            record[f'queue_{index}'] = len(server_farm_queue)
+        return record
 
-if __name__ == "__main__":
+    def print(self):
+        print()
+        print(self.format_state(), end="")
+
+
+class PipelineSimulation:
+    # Engine for the default policy that needs no event list. A farm only receives the jobs of its class and
+    # the jobs killed at the time limit of the farm before it, so the farms are computed one after the other:
+    # each farm is a multi-server FCFS queue (Kiefer-Wolfowitz recursion over the server free times), and the
+    # jobs it kills arrive at the next farm at their kill times. The departures are the same as those of
+    # SimulationManager, in the same order.
+    #
+    # Ties follow the rule of the event list: every start of service gets a key that sorts like the moment the
+    # event engine calls start_service. A start triggered by an arrival at time t has the key
+    # (t, ARRIVAL, job index); one triggered by a departure at t has (t, DEPARTURE, key of the departing job's
+    # start, 0) when the freed server takes the queue head and (..., 1) when the departing job is rerouted to the
+    # next farm, which SimulationManager.handle_departure does in this order. A start happens at the later of
+    # the job's arrival and the freeing of its server, so its key is the larger of the two keys, and jobs
+    # finishing at the same time leave in the order of their start keys, as departure events do
+    def __init__(self):
+        self.warm_up_time = 0
+        # Cumulative response time and number of completed jobs per class
+        self.T = [0, 0]
+        self.n = [0, 0]
+        self.histograms = [ResponseTimeHistogram() for _ in range(4)]
+        # Columns of all jobs, finish_time is None for a job that never leaves
+        self.arrival_time = []
+        self.service_time = []
+        self.job_class = []
+        self.is_rerouted = []
+        self.finish_time = []
+        self.start_key = []
+        # Kept for run_replication, which sets it on either engine
+        self.finished_jobs = None
+
+    def run_config(self, config):
+        self.read_jobs(config)
+        self.run_farms(config)
+
+    def read_jobs(self, config):
+        # Fills the arrival_time, service_time and job_class columns from the job source of config
+        if type(config.policy) is not Policy:
+            raise ValueError(f"the pipeline engine only runs the default policy, not {config.policy.name!r}")
+        job_source = config.job_source()
+        if isinstance(job_source, NumpyJobSource):
+            for arrival_times, service_times, job_classes in job_source.iter_batches():
+                self.arrival_time.extend(arrival_times)
+                self.service_time.extend(service_times)
+                self.job_class.extend(job_classes)
+        else:
+            for job in job_source:
+                self.arrival_time.append(job.arrival_time)
+                self.service_time.append(job.service_time)
+                self.job_class.append(job.job_class)
+
+    def run_farms(self, config):
+        # Runs the farms on the columns filled by read_jobs
+        self.warm_up_time = config.warm_up_time
+        num_jobs = len(self.arrival_time)
+        self.is_rerouted = [False] * num_jobs
+        self.finish_time = [None] * num_jobs
+        self.start_key = [None] * num_jobs
+        farm_layout = config.farm_layout()
+        if isfinite(farm_layout[-1][1]):
+            raise ValueError("the last farm cannot have a time limit")
+        # (arrival key, job index) of the jobs routed to each farm on arrival, in arrival order
+        farm_arrivals = [[] for _ in farm_layout]
+        class_arrivals = [farm_arrivals[min(job_class, len(farm_layout) - 1)].append
+                          for job_class in range(config.num_classes)]
+        for index, (arrival_time, job_class) in enumerate(zip(self.arrival_time, self.job_class)):
+            class_arrivals[job_class](((arrival_time, ARRIVAL, index), index))
+        killed = []
+        for (num_servers, t_limit), arrivals in zip(farm_layout, farm_arrivals):
+            # Killed jobs start in key order, so their kill keys are sorted and merge with the arrivals
+            killed = self.run_farm(heapq.merge(arrivals, killed), num_servers, t_limit)
+        num_classes = config.num_classes
+        self.T = [0] * num_classes
+        self.n = [0] * num_classes
+        self.histograms = [ResponseTimeHistogram() for _ in range(2 * num_classes)]
+        for arrival_time, job_class, is_rerouted, finish_time in zip(self.arrival_time, self.job_class,
+                                                                     self.is_rerouted, self.finish_time):
+            if finish_time is not None and finish_time >= self.warm_up_time:
+                self.histograms[job_class + num_classes * is_rerouted].add(finish_time - arrival_time)
+                if not is_rerouted:
+                    self.T[job_class] += finish_time - arrival_time
+                    self.n[job_class] += 1
+
+    def run_farm(self, arrivals, num_servers, t_limit):
+        # FCFS: every job starts on the server that becomes free first, at its arrival time at the latest.
+        # arrivals are (arrival key, job index) in key order. Returns (arrival key at the next farm, job index)
+        # of the jobs cut at t_limit
+        service_time = self.service_time
+        finish_time = self.finish_time
+        is_rerouted = self.is_rerouted
+        start_keys = self.start_key
+        killed = []
+        if not num_servers:
+            # Jobs routed to a farm without servers wait forever
+            return killed
+        # Keys of the moments the servers become free, the first element of a key is its time
+        free_keys = [(-inf,)] * num_servers
+        heapreplace = heapq.heapreplace
+        for arrival_key, index in arrivals:
+            start_key = free_keys[0]
+            if start_key < arrival_key:
+                start_key = arrival_key
+            start_keys[index] = start_key
+            if service_time[index] > t_limit:
+                kill_time = start_key[0] + t_limit
+                heapreplace(free_keys, (kill_time, DEPARTURE, start_key, 0))
+                is_rerouted[index] = True
+                killed.append(((kill_time, DEPARTURE, start_key, 1), index))
+            else:
+                finish_time[index] = start_key[0] + service_time[index]
+                heapreplace(free_keys, (finish_time[index], DEPARTURE, start_key, 0))
+        return killed
+
+    def mean_response_times(self):
+        # Per class, 0 for a class without completed jobs
+        return [T / n if n else 0 for T, n in zip(self.T, self.n)]
+
+    def write_output(self, s, out_folder='output'):
+        write_mrt(s, self.mean_response_times(), out_folder)
+        write_quantiles(s, self.histograms, out_folder)
+        finish_time = self.finish_time
+        start_key = self.start_key
+        # In departure event order: by finish time, then by the start of the last service
+        order = sorted((index for index in range(len(finish_time)) if finish_time[index] is not None),
+                       key=lambda index: (finish_time[index], start_key[index]))
+        with open(os.path.join(out_folder, 'dep_' + s + '.txt'), 'w') as file:
+            for index in order:
+                job_class = self.job_class[index]
+                job_class = 'r' + str(job_class) if self.is_rerouted[index] else str(job_class)
+                file.write(f'{self.arrival_time[index]:.4f} {finish_time[index]:.4f} {job_class} \n')
+
+
+ENGINES = {'events': SimulationManager, 'pipeline': PipelineSimulation}
+
+
+def t_cdf(t, df):
+    # P(T <= t) of Student's t with an integer number of degrees of freedom, exact up to rounding: the finite
+    # series in cos(theta) of Abramowitz and Stegun 26.7.3 (odd df) and 26.7.4 (even df)
+    theta = atan(abs(t) / sqrt(df))
+    cos2 = cos(theta) ** 2
+    if df % 2:
+        term = cos(theta)
+        series = 0.0
+        for j in range(1, (df - 1) // 2 + 1):
+            series += term
+            term *= cos2 * 2 * j / (2 * j + 1)
+        two_sided = 2 / pi * (theta + sin(theta) * series)
+    else:
+        term = 1.0
+        series = 0.0
+        for j in range(1, df // 2 + 1):
+            series += term
+            term *= cos2 * (2 * j - 1) / (2 * j)
+        two_sided = sin(theta) * series
+    return 0.5 + 0.5 * two_sided if t >= 0 else 0.5 - 0.5 * two_sided
+
+
+def t_quantile(p, df):
+    if df == 1:
+        return tan(pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) * sqrt(2 / (4 * p * (1 - p)))
+    if p < 0.5:
+        return -t_quantile(1 - p, df)
+    # Cornish-Fisher expansion around the normal quantile: off by up to 0.05 at df = 3 in the tails, below 1e-5
+    # for df > 30 and p <= 0.9995
+    z = statistics.NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    quantile = z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+    if df > 30:
+        return quantile
+    # Newton's method on the exact CDF from there; the CDF is concave above 0, so the steps converge monotonically
+    log_density_constant = lgamma((df + 1) / 2) - lgamma(df / 2) - 0.5 * log(df * pi)
+    for _ in range(50):
+        density = exp(log_density_constant - (df + 1) / 2 * log(1 + quantile ** 2 / df))
+        step = (t_cdf(quantile, df) - p) / density
+        quantile -= step
+        if abs(step) <= 1e-13 * (1 + abs(quantile)):
+            break
+    return quantile
+
+
+def confidence_interval(samples, confidence=0.95):
+    # (mean, half width) of the t-based confidence interval
+    if not all(isfinite(sample) for sample in samples):
+        return inf, inf
+    mean = statistics.mean(samples)
+    if len(samples) < 2:
+        return mean, inf
+    half_width = t_quantile((1 + confidence) / 2, len(samples) - 1) * statistics.stdev(samples) / sqrt(len(samples))
+    return mean, half_width
+
+
+def write_mrt(s, mean_response_times, out_folder='output'):
+    # The class means on one line, class 0 first
+    os.makedirs(out_folder, exist_ok=True)
+    with open(os.path.join(out_folder, 'mrt_' + s + '.txt'), 'w') as file:
+        file.write(' '.join('{:.4f}'.format(mean_response_time) for mean_response_time in mean_response_times))
+
+
+class ResultCache:
+    # Per-replication results (mean response times and histograms) on disk, one JSON file per result named by a
+    # hash of the config, the random streams and ENGINE_VERSION. The least recently used files are removed once
+    # the folder holds more than max_bytes; a hit refreshes the file's modification time. The folder is scanned
+    # once, after that the size and the LRU order are kept up to date in memory
+    def __init__(self, folder, max_bytes=100 * 2 ** 20):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+        # File size per key, least recently used first
+        self.sizes = OrderedDict()
+        entries = []
+        for entry in os.scandir(folder):
+            if entry.name.endswith('.json'):
+                entry_stat = entry.stat()
+                entries.append((entry_stat.st_mtime, entry.name[:-len('.json')], entry_stat.st_size))
+        for _, key, size in sorted(entries):
+            self.sizes[key] = size
+        self.total_size = sum(self.sizes.values())
+
+    @staticmethod
+    def key(config, streams):
+        text = json.dumps({'engine_version': ENGINE_VERSION, 'config': config.description(),
+                           'seed': streams.seed, 'path': streams.path}, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as file:
+                result = json.load(file)
+            os.utime(self.path(key))
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if key in self.sizes:
+            self.sizes.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        # Written to a temporary file first so a reader never sees a partial result
+        temporary_path = self.path(key) + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(result, file)
+        os.replace(temporary_path, self.path(key))
+        size = os.path.getsize(self.path(key))
+        self.total_size += size - self.sizes.pop(key, 0)
+        self.sizes[key] = size
+        self.evict()
+
+    def evict(self):
+        while self.total_size > self.max_bytes and self.sizes:
+            key, size = self.sizes.popitem(last=False)
+            self.total_size -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+
+def write_quantiles(s, histograms, out_folder='output'):
+    # One row per class and per class of rerouted jobs that has any: label, number of jobs, QUANTILES, max
+    num_classes = len(histograms) // 2
+    with open(os.path.join(out_folder, 'quantiles_' + s + '.txt'), 'w') as file:
+        file.write('class n ' + ' '.join(f'p{quantile * 100:g}' for quantile in QUANTILES) + ' max\n')
+        for index, histogram in enumerate(histograms):
+            if index >= num_classes and not histogram.count:
+                continue
+            values = [histogram.quantile(quantile) for quantile in QUANTILES] + [histogram.max]
+            file.write(f'{histogram_label(index, num_classes)} {histogram.count} ' +
+                       ' '.join('{:.4f}'.format(value) for value in values) + '\n')
+
+
+def merge_histograms(histogram_lists):
+    # Histograms of several replications merged per class
+    merged = []
+    for histograms in zip(*histogram_lists):
+        histogram = ResponseTimeHistogram(histograms[0].relative_accuracy)
+        for other in histograms:
+            histogram.merge(other)
+        merged.append(histogram)
+    return merged
+
+
+def run_replication(config, streams):
+    # Mean response time per class and the response time histograms
+    simulation_manager = ENGINES[config.engine]()
+    simulation_manager.finished_jobs = DepartureWriter()
+    simulation_manager.run_config(config.with_streams(streams))
+    return simulation_manager.mean_response_times(), simulation_manager.histograms
+
+
+def run_replications_cached(configs, streams, executor, cache=None):
+    # run_replication for each (config, streams) pair, results found in the cache are not simulated again
+    results = [None] * len(configs)
+    keys = [ResultCache.key(config, replication_streams) if cache is not None else None
+            for config, replication_streams in zip(configs, streams)]
+    if cache is not None:
+        for index, key in enumerate(keys):
+            result = cache.get(key)
+            if result is not None:
+                results[index] = (result[0], [ResponseTimeHistogram.from_dict(state) for state in result[1]])
+    missing = [index for index, result in enumerate(results) if result is None]
+    for index, result in zip(missing, executor.map(run_replication, [configs[index] for index in missing],
+                                                   [streams[index] for index in missing])):
+        results[index] = result
+        if cache is not None:
+            cache.put(keys[index], [result[0], [histogram.to_dict() for histogram in result[1]]])
+    return results
+
+
+def objective(mean_response_times, weights):
+    if not all(mean_response_times):
+        # A class without completed jobs, e.g. every class 0 job is killed at a Tlimit below alpha0
+        return inf
+    return sum(weight * mean_response_time for weight, mean_response_time in zip(weights, mean_response_times))
+
+
+def evaluate_t_limits(config, t_limits, streams, executor, weights, cache=None):
+    # Every candidate sees the same streams, i.e. the same arrivals and service times (common random numbers)
+    configs = [config.with_t_limit(t_limit) for t_limit in t_limits for _ in streams]
+    results = run_replications_cached(configs, streams * len(t_limits), executor, cache)
+    objectives = [objective(mean_response_times, weights) for mean_response_times, _ in results]
+    return {t_limit: objectives[index * len(streams):(index + 1) * len(streams)]
+            for index, t_limit in enumerate(t_limits)}
+
+
+def sweep_t_limit(config, low, high, num_points=9, num_refinements=1, num_replications=10, seed=0, processes=None,
+                  confidence=0.95, weights=None, cache=None):
+    # Grid search over [low, high] for the time limit of farm 0, then num_refinements finer grids around
+    # the best candidate
+    if num_points < 2:
+        raise ValueError(f"a sweep needs at least 2 grid points, not {num_points}")
+    if weights is None:
+        weights = config.objective_weights()
+    streams = replication_streams(seed, num_replications)
+    objectives = {}
+    with ProcessPoolExecutor(processes) as executor:
+        for _ in range(num_refinements + 1):
+            step = (high - low) / (num_points - 1)
+            t_limits = [round(low + index * step, 10) for index in range(num_points)]
+            objectives.update(evaluate_t_limits(config, [t_limit for t_limit in t_limits if t_limit not in objectives],
+                                                streams, executor, weights, cache))
+            best = min(t_limits, key=lambda t_limit: statistics.mean(objectives[t_limit]))
+            low, high = max(low, best - step), min(high, best + step)
+    best = min(objectives, key=lambda t_limit: statistics.mean(objectives[t_limit]))
+    # (t_limit, objective mean, half width, difference to the best, half width of the paired difference)
+    curve = []
+    for t_limit in sorted(objectives):
+        mean, half_width = confidence_interval(objectives[t_limit], confidence)
+        difference, difference_half_width = confidence_interval(
+            [value - best_value for value, best_value in zip(objectives[t_limit], objectives[best])], confidence)
+        curve.append((t_limit, mean, half_width, difference, difference_half_width))
+    return best, curve
+
+
+def run_windows_replication(config, streams, window_width):
+    simulation_manager = SimulationManager()
+    simulation_manager.finished_jobs = DepartureWriter()
+    simulation_manager.response_time_windows = ResponseTimeWindows(window_width, config.num_classes)
+    simulation_manager.run_config(config.with_streams(streams))
+    return simulation_manager.response_time_windows
+
+
+def welch_moving_average(series, half_window):
+    # Welch's moving average, the window shrinks near the start of the series
+    smoothed = []
+    for index in range(len(series) - half_window):
+        width = min(index, half_window)
+        smoothed.append(statistics.mean(series[index - width:index + width + 1]))
+    return smoothed
+
+
+def detect_warm_up(config, num_replications=5, seed=0, processes=None, window_width=None, half_window=5,
+                   tolerance=0.05):
+    # Welch's method: average the windowed mean response times over replications, smooth them and
+    # return the start of the first window where all classes have reached their steady level within tolerance,
+    # the steady level being the mean of the second half of the smoothed curve
+    if window_width is None:
+        window_width = config.time_end / 100
+    # The pilot runs get their own child of the root seed, so they never replay the sample paths of the
+    # replications that replicate() runs with the same seed
+    pilot = RandomStreams(seed).spawn('warm-up')
+    streams = [pilot.spawn(replication) for replication in range(num_replications)]
+    with ProcessPoolExecutor(processes) as executor:
+        results = list(executor.map(run_windows_replication, [config] * num_replications, streams,
+                                    [window_width] * num_replications))
+    num_windows = int(config.time_end // window_width)
+    warm_up_windows = 0
+    for job_class in range(config.num_classes):
+        series = []
+        for index in range(num_windows):
+            sums = [result.sums[job_class][index] for result in results if index < len(result.counts[job_class])
+                    and result.counts[job_class][index]]
+            counts = [result.counts[job_class][index] for result in results if index < len(result.counts[job_class])
+                      and result.counts[job_class][index]]
+            if counts:
+                series.append(sum(sums) / sum(counts))
+            elif series:
+                series.append(series[-1])
+        smoothed = welch_moving_average(series, half_window)
+        if not smoothed:
+            continue
+        level = statistics.mean(smoothed[len(smoothed) // 2:])
+        settled = 0
+        while settled < len(smoothed) // 2 and abs(smoothed[settled] - level) > tolerance * level:
+            settled += 1
+        warm_up_windows = max(warm_up_windows, settled + num_windows - len(series))
+    return warm_up_windows * window_width
+
+
+def trend_statistic(samples):
+    # t statistic of the least squares slope of the samples against their index, large when they keep rising
+    num_samples = len(samples)
+    mean_index = (num_samples - 1) / 2
+    mean = statistics.mean(samples)
+    sxx = sum((index - mean_index) ** 2 for index in range(num_samples))
+    slope = sum((index - mean_index) * (sample - mean) for index, sample in enumerate(samples)) / sxx
+    residuals = sum((sample - mean - slope * (index - mean_index)) ** 2 for index, sample in enumerate(samples))
+    if residuals == 0:
+        return inf if slope > 0 else 0.0
+    return slope / sqrt(residuals / (num_samples - 2) / sxx)
+
+
+def run_sequential(config, precision, batch_time=None, confidence=0.95, num_batches=20, max_time=None,
+                   divergence_level=0.999):
+    # Batch means on one long run: simulate one more batch at a time and stop as soon as the confidence
+    # interval half width of every class mean is within precision times the mean. When there are
+    # 2 * num_batches batches, neighbouring batches are merged so batches grow long enough to be nearly independent.
+    # The run also stops at max_time, by default 1000 times the config's end time after the warm-up, and
+    # when the batch means of a class rise with a one-sided trend test significant at divergence_level each time
+    # the batches have just been merged: an overloaded farm never reaches the precision
+    if batch_time is None:
+        batch_time = config.time_end / 20
+    if max_time is None:
+        max_time = config.warm_up_time + 1000 * config.time_end
+    config = copy.copy(config)
+    config.time_end = inf
     simulation_manager = SimulationManager()
-    simulation_manager.run()
+    simulation_manager.finished_jobs = DepartureWriter()
+    simulation_manager.event_queue = EVENT_LISTS[config.event_list]()
+    simulation_manager.setup_farms(config.farm_layout(), config.num_classes)
+    simulation_manager.policy = config.policy
+    # Only for the histograms, the batches leave out the warm-up period themselves
+    simulation_manager.warm_up_time = config.warm_up_time
+    simulation_manager.set_job_source(config.job_source())
+    simulation_manager.run_until(config.warm_up_time)
+    # [T, n] per batch and class
+    batches = [[] for _ in range(config.num_classes)]
+    batch_end = config.warm_up_time
+    intervals = [(inf, inf)] * config.num_classes
+    stop_reason = 'max time'
+    while batch_end < max_time:
+        T, n = simulation_manager.T[:], simulation_manager.n[:]
+        # The last batch ends at max_time
+        batch_end = min(batch_end + batch_time, max_time)
+        simulation_manager.run_until(batch_end)
+        for job_class, class_batches in enumerate(batches):
+            class_batches.append([simulation_manager.T[job_class] - T[job_class],
+                                  simulation_manager.n[job_class] - n[job_class]])
+        if len(batches[0]) == 2 * num_batches:
+            batches = [[[first[0] + second[0], first[1] + second[1]] for first, second in zip(
+                class_batches[::2], class_batches[1::2])] for class_batches in batches]
+            batch_time *= 2
+        if len(batches[0]) < num_batches or any(batch[1] == 0 for class_batches in batches for batch in class_batches):
+            continue
+        batch_means = [[batch[0] / batch[1] for batch in class_batches] for class_batches in batches]
+        intervals = [confidence_interval(class_means, confidence) for class_means in batch_means]
+        if all(half_width <= precision * mean for mean, half_width in intervals):
+            stop_reason = 'precision'
+            break
+        if len(batches[0]) == num_batches and any(trend_statistic(class_means) > t_quantile(
+                divergence_level, num_batches - 2) for class_means in batch_means):
+            stop_reason = 'diverging'
+            break
+    # [(mean, half width) per class], number of batches, simulated time, response time histograms and why the
+    # run stopped: 'precision', 'max time' or 'diverging'
+    return intervals, len(batches[0]), batch_end, simulation_manager.histograms, stop_reason
+
+
+def replicate(config, num_replications, seed=0, processes=None, confidence=0.95, cache=None):
+    # Independent replications, each with its own streams spawned from seed, spread over a process pool
+    streams = replication_streams(seed, num_replications)
+    with ProcessPoolExecutor(processes) as executor:
+        results = run_replications_cached([config] * num_replications, streams, executor, cache)
+    # [(mean, half width) per class], response time histograms of all replications together
+    intervals = [confidence_interval([mean_response_times[job_class] for mean_response_times, _ in results],
+                                     confidence) for job_class in range(config.num_classes)]
+    return intervals, merge_histograms([histograms for _, histograms in results])
+
+
+def per_test_path(file_path, s):
+    # One file per test, e.g. trace.txt -> trace_0.txt
+    root, ext = os.path.splitext(file_path)
+    return root + '_' + s + ext
+
+
+def run_test(s, config, args):
+    if config.engine == 'pipeline':
+        simulation = PipelineSimulation()
+        simulation.run_config(config)
+        simulation.write_output(s, args.output)
+        return
+    if args.resume:
+        simulation_manager = SimulationManager.load_checkpoint(per_test_path(args.resume, s))
+    else:
+        simulation_manager = SimulationManager()
+        if args.compact:
+            simulation_manager.finished_jobs = JobTable()
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            simulation_manager.finished_jobs = DepartureWriter(os.path.join(args.output, 'dep_' + s + '.txt'))
+    if args.checkpoint:
+        simulation_manager.checkpoint_file = per_test_path(args.checkpoint, s)
+        simulation_manager.checkpoint_interval = args.checkpoint_every
+    if args.trace != Tracer.OFF:
+        sink = per_test_path(args.trace_file, s) if args.trace_file else sys.stdout
+        simulation_manager.tracer = Tracer(args.trace, args.trace_every, sink, args.trace_format)
+    if args.metrics_window:
+        os.makedirs(args.output, exist_ok=True)
+        simulation_manager.farm_metrics = FarmMetrics(args.metrics_window,
+                                                      os.path.join(args.output, 'metrics_' + s + '.txt'),
+                                                      os.path.join(args.output, 'servers_' + s + '.txt'))
+    # A resumed run continues where the checkpoint left off instead of starting from config
+    run = simulation_manager.run_events if args.resume else lambda: simulation_manager.run_config(config)
+    if not (args.instrument or args.profile):
+        run()
+        simulation_manager.write_output(s, args.output)
+        if args.metrics_window:
+            print(f"Test {s}:\n{simulation_manager.farm_metrics.report()}")
+        return
+    instrumentation = Instrumentation().attach(simulation_manager)
+    if args.profile:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+    run()
+    if args.profile:
+        profiler.disable()
+        memory_snapshot = tracemalloc.take_snapshot()
+        memory_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    simulation_manager.write_output(s, args.output)
+    report = instrumentation.report()
+    if args.profile:
+        profile_stream = io.StringIO()
+        pstats.Stats(profiler, stream=profile_stream).sort_stats('cumulative').print_stats(30)
+        report += f"\n\npeak traced memory: {memory_peak / 2 ** 20:.2f} MiB\ntop allocations:\n"
+        report += '\n'.join(str(statistic) for statistic in memory_snapshot.statistics('lineno')[:10])
+        report += '\n\n' + profile_stream.getvalue()
+        with open(os.path.join(args.output, 'profile_' + s + '.txt'), 'w') as file:
+            file.write(report)
+    print(f"Test {s}:\n{instrumentation.report()}")
+    if args.metrics_window:
+        print(simulation_manager.farm_metrics.report())
+
+
+def open_cache(args):
+    if not args.cache:
+        return None
+    return ResultCache(args.cache, args.cache_size * 2 ** 20)
+
+
+def print_cache_statistics(s, cache):
+    if cache is not None:
+        print(f"Test {s}: {cache.hits} of {cache.hits + cache.misses} replications read from the cache")
+
+
+def run_replications(s, config, args):
+    cache = open_cache(args)
+    intervals, histograms = replicate(config, args.replications, args.seed or 0, args.processes, args.confidence,
+                                      cache)
+    print_cache_statistics(s, cache)
+    for job_class, (mean, half_width) in enumerate(intervals):
+        print(f"Test {s}: class {job_class} mean response time {mean:.4f} +/- {half_width:.4f} "
+              f"({args.confidence:.0%} CI, {args.replications} replications)")
+    write_mrt(s, [mean for mean, _ in intervals], args.output)
+    write_quantiles(s, histograms, args.output)
+
+
+def run_precision(s, config, args):
+    intervals, num_batches, end_time, histograms, stop_reason = run_sequential(
+        config, args.precision, args.batch_time, args.confidence, max_time=args.max_time)
+    if stop_reason == 'diverging':
+        print(f"Test {s}: stopped at time {end_time:.1f}, the batch means keep rising so the farms look overloaded")
+    elif stop_reason == 'max time':
+        print(f"Test {s}: stopped at time {end_time:.1f} before reaching precision {args.precision}")
+    for job_class, (mean, half_width) in enumerate(intervals):
+        print(f"Test {s}: class {job_class} mean response time {mean:.4f} +/- {half_width:.4f} "
+              f"({args.confidence:.0%} CI, {num_batches} batches up to time {end_time:.1f})")
+    write_mrt(s, [mean for mean, _ in intervals], args.output)
+    write_quantiles(s, histograms, args.output)
+
+
+def run_sweep(s, config, args):
+    low, high = args.sweep
+    cache = open_cache(args)
+    best, curve = sweep_t_limit(config, low, high, args.sweep_points, args.sweep_refinements,
+                                args.replications or 10, args.seed or 0, args.processes, args.confidence, args.weights,
+                                cache)
+    print_cache_statistics(s, cache)
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, 'sweep_' + s + '.txt'), 'w') as file:
+        for point in curve:
+            file.write('{:.4f} {:.4f} {:.4f} {:.4f} {:.4f}\n'.format(*point))
+    print(f"Test {s}: Tlimit objective +/- CI, difference to best +/- CI")
+    for t_limit, mean, half_width, difference, difference_half_width in curve:
+        print(f"{t_limit:8.4f} {mean:.4f} +/- {half_width:.4f} {difference:+.4f} +/- {difference_half_width:.4f}")
+    print(f"Test {s}: recommended Tlimit {best:.4f}")
+
+
+def main(args):
+    # All tests run in one process, each one with a fresh SimulationManager
+    for s in args.tests:
+        if args.convert_trace:
+            print(f"Test {s}: wrote {convert_trace(s, args.config)}")
+            continue
+        config = Config.from_folder(s, args.config, args.binary_trace)
+        config.use_numpy = args.numpy
+        config.engine = args.engine
+        config.event_list = args.event_list
+        if args.seed is not None:
+            # Replications spawn their own streams from the seed
+            config.streams = RandomStreams(args.seed)
+        if args.weights:
+            config.weights = args.weights
+        config.policy = SizeBasedPolicy(args.size_threshold) if args.policy == 'size' else POLICIES[args.policy]()
+        if args.warm_up == 'auto' and config.mode == 'random':
+            config.warm_up_time = detect_warm_up(config, max(args.replications, 5), args.seed or 0, args.processes,
+                                                 args.warm_up_window)
+            print(f"Test {s}: warm-up period {config.warm_up_time:.4f}")
+        elif args.warm_up != 'auto':
+            config.warm_up_time = float(args.warm_up)
+        if args.sweep and config.mode == 'random':
+            run_sweep(s, config, args)
+        elif args.precision and config.mode == 'random':
+            run_precision(s, config, args)
+        elif args.replications and config.mode == 'random':
+            run_replications(s, config, args)
+        else:
+            run_test(s, config, args)
+
+
+# The folder of the course tests, with their config/, output/ and ref/ folders
+TEST_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '测试文件')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the server farm simulation on config/*_<test>.txt")
+    parser.add_argument("tests", nargs="*", help="test numbers, e.g. 0 1 2; no test starts the interactive mode")
+    parser.add_argument("--folder",
+                        help="folder holding config/ and output/, default the current folder if it has a config/ "
+                             "folder and the test folder next to this script otherwise")
+    parser.add_argument("--config", help="folder with mode/para/interarrival/service files, default <folder>/config")
+    parser.add_argument("--output", help="folder for the mrt/dep files, default <folder>/output")
+    parser.add_argument("--trace", default=Tracer.OFF, choices=Tracer.LEVELS, help="event tracing level")
+    parser.add_argument("--trace-every", type=int, default=100, help="trace every Nth event with --trace sampled")
+    parser.add_argument("--trace-file",
+                        help="write the trace to this file instead of stdout, with --trace-format csv the summary "
+                             "goes to <file>_summary")
+    parser.add_argument("--trace-format", default="text", choices=Tracer.FORMATS, help="trace record format")
+    parser.add_argument("--numpy", action="store_true", help="generate the random mode workload with numpy")
+    parser.add_argument("--compact", action="store_true",
+                        help="keep completed jobs in typed arrays instead of streaming them to the dep file")
+    parser.add_argument("--replications", type=int, default=0, help="independent replications for random mode")
+    parser.add_argument("--seed", type=int, help="root seed of the random streams of the run or the replications")
+    parser.add_argument("--processes", type=int, help="worker processes for the replications")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the intervals")
+    parser.add_argument("--sweep", type=float, nargs=2, metavar=("LOW", "HIGH"),
+                        help="search the farm 0 Tlimit in [LOW, HIGH] that minimises the sum of w[k] * T[k]/n[k]")
+    parser.add_argument("--sweep-points", type=int, default=9, help="grid points per sweep round")
+    parser.add_argument("--sweep-refinements", type=int, default=1, help="refined grids around the best Tlimit")
+    parser.add_argument("--weights", type=float, nargs="+", metavar="W",
+                        help="weight of each class mean response time, default weights_<test>.txt or "
+                             f"{WEIGHTS[0]} {WEIGHTS[1]}")
+    parser.add_argument("--warm-up", default="0",
+                        help="departures before this time are not counted, 'auto' detects it with Welch's method")
+    parser.add_argument("--warm-up-window", type=float, help="window width for the warm-up detection")
+    parser.add_argument("--precision", type=float,
+                        help="run one long simulation until all class means reach this relative CI half width")
+    parser.add_argument("--batch-time", type=float, help="initial simulated time per batch with --precision")
+    parser.add_argument("--max-time", type=float,
+                        help="stop --precision runs at this simulated time, default 1000 times the end time of the "
+                             "config after the warm-up")
+    parser.add_argument("--convert-trace", action="store_true",
+                        help="convert the trace mode text config to config/trace_<test>.bin and exit")
+    parser.add_argument("--binary-trace", action="store_true", help="read trace mode jobs from config/trace_<test>.bin")
+    parser.add_argument("--checkpoint", help="save the simulation state to this file (one file per test)")
+    parser.add_argument("--checkpoint-every", type=float, default=1000,
+                        help="simulation time between checkpoints")
+    parser.add_argument("--resume", help="continue the run saved in this checkpoint file (one file per test)")
+    parser.add_argument("--policy", default="default", choices=list(POLICIES),
+                        help="routing and time limit policy, 'default' is class based routing with restart")
+    parser.add_argument("--size-threshold", type=float, default=3.0,
+                        help="largest service time routed to group 0 with --policy size")
+    parser.add_argument("--engine", default="events", choices=list(ENGINES),
+                        help="'pipeline' computes the farms one after the other without an event list, "
+                             "for the default policy only")
+    parser.add_argument("--cache", help="folder of cached replication results for --replications and --sweep")
+    parser.add_argument("--cache-size", type=float, default=100, help="size limit of the cache folder in MiB")
+    parser.add_argument("--event-list", default="heap", choices=list(EVENT_LISTS),
+                        help="pending event list of the events engine, 'calendar' suits very many pending events")
+    parser.add_argument("--metrics-window", type=float,
+                        help="write utilisation, queue length and throughput per farm in windows of this "
+                             "simulated time to output/metrics_<test>.txt, and busy time per server to "
+                             "output/servers_<test>.txt")
+    parser.add_argument("--instrument", action="store_true", help="print event counters and handler times")
+    parser.add_argument("--profile", action="store_true",
+                        help="run under cProfile and tracemalloc and write output/profile_<test>.txt")
+    args = parser.parse_args(argv)
+    if args.trace_every < 1:
+        parser.error("--trace-every must be at least 1")
+    if args.sweep_points < 2:
+        parser.error("--sweep-points must be at least 2")
+    if args.folder is None:
+        args.folder = '.' if os.path.isdir('config') else TEST_FOLDER
+    if args.config is None:
+        args.config = os.path.join(args.folder, 'config')
+    if args.output is None:
+        args.output = os.path.join(args.folder, 'output')
+    if args.engine == 'pipeline':
+        event_options = {'--trace': args.trace != Tracer.OFF, '--compact': args.compact,
+                         '--checkpoint': args.checkpoint, '--resume': args.resume, '--precision': args.precision,
+                         '--policy': args.policy != 'default', '--instrument': args.instrument,
+                         '--profile': args.profile, '--metrics-window': args.metrics_window}
+        for option, is_set in event_options.items():
+            if is_set:
+                parser.error(f"{option} needs --engine events")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.tests:
+        main(args)
+    else:
+        simulation_manager = SimulationManager()
+        simulation_manager.run()
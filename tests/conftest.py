@@ -0,0 +1,27 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# The tests import main.py from the repository root
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def test_config():
+    # Config folder of the course tests 0 to 6
+    return ROOT / '测试文件' / 'config'
+
+
+@pytest.fixture
+def copy_test_config(test_config, tmp_path):
+    # Copies the config files of course test s into folder, tmp_path by default, and returns the folder
+    def copy(s, folder=None):
+        folder = tmp_path if folder is None else folder
+        for path in test_config.glob(f'*_{s}.txt'):
+            shutil.copy(path, folder)
+        return folder
+
+    return copy
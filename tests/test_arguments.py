@@ -0,0 +1,22 @@
+from pathlib import Path
+
+import pytest
+
+from main import parse_args
+
+
+@pytest.mark.parametrize('every', ['0', '-3'])
+def test_trace_every_below_1_is_rejected(every):
+    with pytest.raises(SystemExit):
+        parse_args(['0', '--trace', 'sampled', '--trace-every', every])
+
+
+def test_folder_sets_config_and_output():
+    args = parse_args(['0', '--folder', 'tests_folder'])
+    assert (args.config, args.output) == (str(Path('tests_folder', 'config')), str(Path('tests_folder', 'output')))
+
+
+@pytest.mark.parametrize('points', ['1', '0'])
+def test_sweep_points_below_2_is_rejected(points):
+    with pytest.raises(SystemExit):
+        parse_args(['5', '--sweep', '2', '4', '--sweep-points', points])
@@ -0,0 +1,25 @@
+import json
+import os
+
+from main import ResultCache
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    result = [[1.5, 2.5], []]
+    size = len(json.dumps(result))
+    cache = ResultCache(str(tmp_path), max_bytes=3 * size)
+    for key in 'abc':
+        cache.put(key, result)
+    assert cache.get('a') == result
+    cache.put('d', result)
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json', 'd.json']
+    assert cache.total_size == 3 * size
+
+
+def test_index_is_loaded_from_the_folder(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for key in 'abc':
+        cache.put(key, [[float(ord(key))], []])
+    reopened = ResultCache(str(tmp_path))
+    assert set(reopened.sizes) == set('abc')
+    assert reopened.total_size == cache.total_size
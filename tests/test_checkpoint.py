@@ -0,0 +1,23 @@
+from main import Config, SimulationManager
+
+
+def test_intervals_without_events_are_not_checkpointed(tmp_path, monkeypatch):
+    # Two bursts of jobs 10000 time units apart, checkpointed every time unit
+    config = Config('trace', 3, 1, 3, interarrival=[1, 0.5, 0.5, 10000, 0.5],
+                    service=[(2, 0), (4, 0), (1, 1), (2, 1), (5, 0)])
+    saved_times = []
+    save_checkpoint = SimulationManager.save_checkpoint
+
+    def record_checkpoint(simulation_manager, file_path):
+        saved_times.append(simulation_manager.current_time)
+        save_checkpoint(simulation_manager, file_path)
+
+    monkeypatch.setattr(SimulationManager, 'save_checkpoint', record_checkpoint)
+    simulation_manager = SimulationManager()
+    simulation_manager.checkpoint_file = str(tmp_path / 'run.pickle')
+    simulation_manager.checkpoint_interval = 1
+    simulation_manager.run_config(config)
+    assert len(saved_times) < 20
+    assert len(simulation_manager.finished_jobs) == 5
+    resumed = SimulationManager.load_checkpoint(str(tmp_path / 'run.pickle'))
+    assert resumed.mean_response_times() == simulation_manager.mean_response_times()
@@ -0,0 +1,49 @@
+import json
+import random
+
+import pytest
+
+from main import ResponseTimeHistogram
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+
+def response_times(num_values=20000, seed=1):
+    # Spread over several orders of magnitude, with some zeros
+    rng = random.Random(seed)
+    return [0.0 if rng.random() < 0.01 else rng.lognormvariate(0, 1.5) for _ in range(num_values)]
+
+
+def histogram_of(values):
+    histogram = ResponseTimeHistogram()
+    for value in values:
+        histogram.add(value)
+    return histogram
+
+
+@pytest.mark.parametrize('q', QUANTILES)
+def test_quantiles_within_relative_accuracy(q):
+    values = response_times()
+    exact = sorted(values)[int(q * (len(values) - 1))]
+    assert histogram_of(values).quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_merge_equals_one_histogram_of_all_values():
+    values = response_times()
+    merged = histogram_of(values[:7000]).merge(histogram_of(values[7000:]))
+    assert merged.to_dict() == histogram_of(values).to_dict()
+
+
+def test_json_round_trip_keeps_the_counts():
+    histogram = histogram_of(response_times())
+    restored = ResponseTimeHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    assert restored.counts == histogram.counts
+    assert (restored.zero_count, restored.count, restored.min, restored.max) == \
+        (histogram.zero_count, histogram.count, histogram.min, histogram.max)
+    assert [restored.quantile(q) for q in QUANTILES] == [histogram.quantile(q) for q in QUANTILES]
+
+
+def test_empty_histogram_round_trip():
+    restored = ResponseTimeHistogram.from_dict(json.loads(json.dumps(ResponseTimeHistogram().to_dict())))
+    assert (restored.count, restored.quantile(0.5)) == (0, 0)
+    assert restored.merge(histogram_of([2.0])).min == 2.0
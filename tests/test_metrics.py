@@ -0,0 +1,44 @@
+import pytest
+
+from main import main, parse_args
+
+# Farms of a 3-farm run: number of servers and time limit
+FARMS = [(3, 2.0), (2, 4.0), (3, None)]
+WINDOW_WIDTH = 50
+
+
+def read_table(path):
+    with open(path) as file:
+        header, *rows = [line.split() for line in file]
+    return [dict(zip(header, row)) for row in rows]
+
+
+def test_metrics_add_up_to_the_departures_and_busy_times(tmp_path, copy_test_config):
+    config_folder = tmp_path / 'config'
+    config_folder.mkdir()
+    copy_test_config('5', config_folder)
+    (config_folder / 'farms_5.txt').write_text(''.join(
+        f'{num_servers} {t_limit}\n' if t_limit else f'{num_servers}\n' for num_servers, t_limit in FARMS))
+    main(parse_args(['5', '--folder', str(tmp_path), '--seed', '2', '--policy', 'jsq',
+                     '--metrics-window', str(WINDOW_WIDTH)]))
+    output = tmp_path / 'output'
+    windows = read_table(output / 'metrics_5.txt')
+    servers = read_table(output / 'servers_5.txt')
+    with open(output / 'dep_5.txt') as file:
+        departures = [line.split() for line in file]
+
+    # Every job leaves once, from one farm
+    assert sum(int(window['completions']) for window in windows) == len(departures)
+
+    # The run ends with the last departure, which also ends the last window
+    end_time = max(float(departure[1]) for departure in departures)
+    for farm, (num_servers, _) in enumerate(FARMS):
+        busy_time = 0
+        for window in windows:
+            if window['farm'] == str(farm):
+                duration = min(WINDOW_WIDTH, end_time - float(window['window_start']))
+                busy_time += float(window['utilisation']) * num_servers * duration
+        server_busy_time = sum(float(server['busy_time']) for server in servers if server['farm'] == str(farm))
+        assert server_busy_time > 0
+        # Utilisations are written with 4 decimals
+        assert busy_time == pytest.approx(server_busy_time, abs=len(windows) * num_servers * WINDOW_WIDTH * 1e-4)
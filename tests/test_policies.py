@@ -0,0 +1,41 @@
+from main import Config, NoRestartPolicy, Policy, ShortestQueuePolicy, SimulationManager, SizeBasedPolicy
+
+
+def run_policy(tmp_path, policy, n0, t_limit, interarrival, service, n=2):
+    # The dep file lines of a trace mode run under policy
+    config = Config('trace', n, n0, t_limit, interarrival=interarrival, service=service)
+    config.policy = policy
+    simulation_manager = SimulationManager()
+    simulation_manager.run_config(config)
+    simulation_manager.write_output('0', str(tmp_path))
+    return (tmp_path / 'dep_0.txt').read_text().splitlines()
+
+
+def test_shortest_queue_uses_an_idle_farm_then_the_shortest_queue(tmp_path):
+    # Arrivals at 1, 2, 3 and 3.5: the second job finds farm 0 busy and farm 1 idle; the third finds both
+    # busy with empty queues and stays with its class; the fourth joins the empty queue of farm 1
+    interarrival = [1, 1, 1, 0.5]
+    service = [(5, 0), (5, 0), (1, 0), (1, 1)]
+    assert run_policy(tmp_path, ShortestQueuePolicy(), 1, 100, interarrival, service) == [
+        '1.0000 6.0000 0 ', '2.0000 7.0000 0 ', '3.0000 7.0000 0 ', '3.5000 8.0000 1 ']
+    # Class based routing queues the class 0 jobs at farm 0 and leaves farm 1 to the class 1 job
+    assert run_policy(tmp_path, Policy(), 1, 100, interarrival, service) == [
+        '3.5000 4.5000 1 ', '1.0000 6.0000 0 ', '2.0000 11.0000 0 ', '3.0000 12.0000 0 ']
+
+
+def test_size_based_routes_by_the_threshold(tmp_path):
+    # Service times up to 3 go to farm 0 and longer ones to farm 1, whatever the class
+    interarrival = [1, 1, 0.5]
+    service = [(2, 1), (4, 0), (1, 0)]
+    assert run_policy(tmp_path, SizeBasedPolicy(3), 1, 10, interarrival, service) == [
+        '1.0000 3.0000 1 ', '2.5000 4.0000 0 ', '2.0000 6.0000 0 ']
+
+
+def test_no_restart_serves_the_rest_in_the_next_farm(tmp_path):
+    # The class 0 job is cut at 1 + 3 = 4 and only needs 5 - 3 = 2 more in farm 1
+    interarrival = [1, 1]
+    service = [(5, 0), (1, 1)]
+    assert run_policy(tmp_path, NoRestartPolicy(), 1, 3, interarrival, service) == [
+        '2.0000 3.0000 1 ', '1.0000 6.0000 r0 ']
+    # With the default policy it starts again from the beginning
+    assert run_policy(tmp_path, Policy(), 1, 3, interarrival, service) == ['2.0000 3.0000 1 ', '1.0000 9.0000 r0 ']
@@ -0,0 +1,22 @@
+from main import Config, RandomStreams, run_sequential
+
+
+def load_config(config_folder, s='5'):
+    config = Config.from_folder(s, str(config_folder))
+    config.streams = RandomStreams(1)
+    return config
+
+
+def test_last_batch_ends_at_max_time(test_config):
+    config = load_config(test_config)
+    *_, end_time, _, stop_reason = run_sequential(config, 1e-6, max_time=5000)
+    assert (end_time, stop_reason) == (5000, 'max time')
+
+
+def test_overloaded_farms_stop_as_diverging(tmp_path, copy_test_config):
+    copy_test_config('5')
+    # Five times the arrival rate the farms can serve
+    rates = (tmp_path / 'interarrival_5.txt').read_text().split()
+    (tmp_path / 'interarrival_5.txt').write_text(' '.join([str(5 * float(rates[0]))] + rates[1:]))
+    *_, end_time, _, stop_reason = run_sequential(load_config(tmp_path), 0.01)
+    assert stop_reason == 'diverging'
@@ -0,0 +1,20 @@
+import pytest
+
+from main import t_quantile
+
+# Student's t quantiles to 12 digits, from published tables
+T_TABLE = {(0.975, 3): 3.18244630528, (0.995, 3): 5.84090930973, (0.9995, 3): 12.9239786367,
+           (0.995, 5): 4.03214298356, (0.975, 10): 2.22813885199, (0.95, 19): 1.72913281152,
+           (0.975, 30): 2.04227245630, (0.995, 30): 2.74999565357}
+
+
+@pytest.mark.parametrize('p, df', T_TABLE)
+def test_t_quantile_matches_table(p, df):
+    assert t_quantile(p, df) == pytest.approx(T_TABLE[p, df], abs=1e-9)
+    assert t_quantile(1 - p, df) == pytest.approx(-T_TABLE[p, df], abs=1e-9)
+
+
+def test_t_quantile_above_30_degrees_of_freedom():
+    # Cornish-Fisher range; t(0.995, 40) and t(0.975, 120)
+    assert t_quantile(0.995, 40) == pytest.approx(2.70445926743, abs=1e-6)
+    assert t_quantile(0.975, 120) == pytest.approx(1.97993040505, abs=1e-6)
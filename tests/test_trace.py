@@ -0,0 +1,56 @@
+import pytest
+
+from main import Config, convert_trace
+
+
+def test_binary_trace_has_the_jobs_of_the_text_trace(tmp_path, copy_test_config):
+    copy_test_config('1')
+    convert_trace('1', str(tmp_path))
+    text_jobs = Config.from_folder('1', str(tmp_path)).jobs()
+    binary_jobs = Config.from_folder('1', str(tmp_path), binary_trace=True).jobs()
+    assert [(job.arrival_time, job.service_time, job.job_class) for job in binary_jobs] == \
+        [(job.arrival_time, job.service_time, job.job_class) for job in text_jobs]
+
+
+def test_random_mode_is_rejected_before_writing(tmp_path, copy_test_config):
+    copy_test_config('5')
+    files = sorted(path.name for path in tmp_path.iterdir())
+    with pytest.raises(ValueError, match='random'):
+        convert_trace('5', str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == files
+
+
+def test_class_count_is_read_from_the_header(tmp_path, monkeypatch):
+    (tmp_path / 'mode_7.txt').write_text('trace\n')
+    (tmp_path / 'para_7.txt').write_text('3\n1\n3\n')
+    (tmp_path / 'interarrival_7.txt').write_text('1\n2\n1\n')
+    (tmp_path / 'service_7.txt').write_text('2 0\n3 2\n1 1\n')
+    convert_trace('7', str(tmp_path))
+
+    def scan_columns(file_path):
+        raise AssertionError('num_classes must not read the trace columns')
+
+    monkeypatch.setattr('main.read_binary_trace', scan_columns)
+    assert Config.from_folder('7', str(tmp_path), binary_trace=True).num_classes == 3
+
+
+@pytest.mark.parametrize('size_change', [-1, -17, 8])
+def test_binary_trace_of_the_wrong_length_is_rejected(tmp_path, copy_test_config, size_change):
+    copy_test_config('1')
+    trace_file = convert_trace('1', str(tmp_path))
+    with open(trace_file, 'rb') as file:
+        data = file.read()
+    with open(trace_file, 'wb') as file:
+        file.write(data[:size_change] if size_change < 0 else data + bytes(size_change))
+    with pytest.raises(ValueError, match='not a binary trace file'):
+        Config.from_folder('1', str(tmp_path), binary_trace=True).jobs()
+
+
+def test_blank_lines_are_skipped_in_each_file(tmp_path):
+    (tmp_path / 'mode_8.txt').write_text('trace\n')
+    (tmp_path / 'para_8.txt').write_text('3\n1\n3\n')
+    (tmp_path / 'interarrival_8.txt').write_text('1\n\n2\n1\n\n')
+    (tmp_path / 'service_8.txt').write_text('2 0\n3 1\n\n1 1\n')
+    convert_trace('8', str(tmp_path))
+    jobs = Config.from_folder('8', str(tmp_path), binary_trace=True).jobs()
+    assert [(job.arrival_time, job.service_time, job.job_class) for job in jobs] == [(1, 2, 0), (3, 3, 1), (4, 1, 1)]
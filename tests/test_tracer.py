@@ -0,0 +1,38 @@
+import csv
+
+import pytest
+
+from main import Config, SimulationManager, Tracer
+
+
+def run_traced(level, sink):
+    config = Config('trace', 3, 1, 3, interarrival=[1, 0.5, 0.5, 1, 0.5],
+                    service=[(2, 0), (4, 0), (1, 1), (2, 1), (5, 0)])
+    simulation_manager = SimulationManager()
+    simulation_manager.tracer = Tracer(level, sink=sink, record_format='csv')
+    simulation_manager.run_config(config)
+    return simulation_manager
+
+
+@pytest.mark.parametrize('level', [Tracer.SUMMARY, Tracer.FULL])
+def test_csv_summary_is_kept_out_of_the_event_table(tmp_path, level):
+    simulation_manager = run_traced(level, str(tmp_path / 'trace.csv'))
+    with open(tmp_path / 'trace.csv') as file:
+        rows = list(csv.reader(file))
+    if level == Tracer.FULL:
+        assert rows[0][:2] == ['time', 'event']
+        assert len(rows) > 1 and all(len(row) == len(rows[0]) for row in rows)
+    else:
+        assert rows == []
+    with open(tmp_path / 'trace_summary.csv') as file:
+        summary = list(csv.DictReader(file))
+    assert len(summary) == 1
+    assert summary[0]['events'] == str(simulation_manager.num_events)
+    assert [summary[0]['n0'], summary[0]['n1']] == [str(num_jobs) for num_jobs in simulation_manager.n]
+
+
+def test_csv_summary_follows_the_events_in_memory():
+    tracer = run_traced(Tracer.FULL, None).tracer
+    blank = tracer.lines.index('')
+    assert tracer.lines[blank + 1].startswith('events,end_time')
+    assert len(tracer.lines) == blank + 3
@@ -9,6 +9,12 @@ For trace mode, it checks mrt_*.txt and dep_*.txt
 
 For random mode, it checks mrt_*.txt only 
 
+Usage:
+    python3 cf_output_with_ref.py 1          check test 1
+    python3 cf_output_with_ref.py 1 dep      check dep_1.txt only (or mrt)
+    python3 cf_output_with_ref.py all        check tests 0 to 6 and print a summary table
+    python3 cf_output_with_ref.py 0 2 '[4-6]'    check several tests, globs match test numbers
+
 Assumptions on file location: This file assumes that the output/ and ref/
 sub-directories are below the directory that this file is located.
     
@@ -28,27 +34,121 @@ This version: 16 March 2024
 # import sys for input argument 
 import sys
 import os 
+import fnmatch
 
 
 # import numpy for easy comparison 
 import numpy as np
-import pandas as pd
+
+# For trace mode, an absolute tolerance is used
+ABS_TOL = 1e-3  # Absolute tolerance 
+
+# Tests 0 to 3 are trace mode, tests 4 to 6 are random mode
+TRACE_MODE_TESTS = range(0, 4)
+RANDOM_MODE_TESTS = range(4, 7)
+
+# For tests 4-6 (which are in random mode), 
+# the mean response time is expected to be within the range 
+MRT_TOL = { 
+             4: {'class_0':[1.414 , 3.3187], 'class_1': [2.6596, 5.4192]}, 
+             5: {'class_0':[1.5555, 2.5282], 'class_1': [3.3785, 6.8222]}, 
+             6: {'class_0':[2.0404, 3.5834], 'class_1': [2.9928, 5.2165]} 
+            }
 
 def read_dep_file(file_path):
-    output_df = pd.read_csv(file_path, header=None, delim_whitespace=True,
-                        names=['arr_time','dep_time','ser_class'],
-                        dtype={'arr_time':float,'dep_time':float,'ser_class':str})
+    # Each line is "arr_time dep_time ser_class", a plain split is all the parsing needed
+    output_times = []
+    output_class = []
+    with open(file_path) as file:
+        for line in file:
+            fields = line.split()
+            if fields:
+                output_times.append((float(fields[0]), float(fields[1])))
+                output_class.append(fields[2])
+
+    return np.array(output_times).reshape(-1, 2), np.array(output_class, dtype=str)
+
+def read_mrt_file(file_path):
+    with open(file_path) as file:
+        return np.array([float(value) for value in file.read().split()])
 
-    output_class = output_df['ser_class'].str.strip().values.astype(str)
+def compare_test(t, out_folder='output', ref_folder='ref', file_ext='.txt'):
+    # Returns one row (test, file, status, max absolute error) per compared file
+    rows = []
+    if t in TRACE_MODE_TESTS:
+        for kind in ['mrt', 'dep']:
+            out_file = os.path.join(out_folder, kind+'_'+str(t)+file_ext)
+            ref_file = os.path.join(ref_folder, kind+'_'+str(t)+'_ref'+file_ext)
+            if not os.path.isfile(out_file):
+                rows.append((t, kind, 'MISSING', None))
+                continue
+            try:
+                if kind == 'mrt':
+                    stu_values, ref_values = read_mrt_file(out_file), read_mrt_file(ref_file)
+                    classes_match = True
+                else:
+                    [stu_values, stu_class] = read_dep_file(out_file)
+                    [ref_values, ref_class] = read_dep_file(ref_file)
+                    classes_match = stu_class.shape == ref_class.shape and np.all(stu_class == ref_class)
+            except (OSError, ValueError, IndexError):
+                rows.append((t, kind, 'UNREADABLE', None))
+                continue
+            if stu_values.shape != ref_values.shape:
+                rows.append((t, kind, f'SHAPE {stu_values.shape} != {ref_values.shape}', None))
+                continue
+            max_error = float(np.max(np.abs(stu_values - ref_values))) if stu_values.size else 0.0
+            if max_error <= ABS_TOL and classes_match:
+                rows.append((t, kind, 'PASS', max_error))
+            else:
+                rows.append((t, kind, 'FAIL' if classes_match else 'FAIL (classes)', max_error))
+    elif t in RANDOM_MODE_TESTS:
+        out_file = os.path.join(out_folder, 'mrt_'+str(t)+file_ext)
+        if not os.path.isfile(out_file):
+            return [(t, 'mrt', 'MISSING', None)]
+        # The error is the distance to the tolerance range, 0 inside the range
+        max_error = 0.0
+        try:
+            mrt_stu = read_mrt_file(out_file)
+            for idx, ser_class in enumerate(['class_0', 'class_1']):
+                low, high = MRT_TOL[t][ser_class]
+                max_error = max(max_error, low - mrt_stu[idx], mrt_stu[idx] - high)
+        except (OSError, ValueError, IndexError):
+            return [(t, 'mrt', 'UNREADABLE', None)]
+        rows.append((t, 'mrt', 'PASS' if max_error == 0 else 'OUT OF RANGE', max_error))
+    return rows
 
-    output_times = output_df[['arr_time','dep_time']].values
+def select_tests(patterns):
+    # 'all' selects every test, other arguments are test numbers or globs over test numbers
+    tests = [str(t) for t in list(TRACE_MODE_TESTS) + list(RANDOM_MODE_TESTS)]
+    selected = []
+    for pattern in patterns:
+        matches = tests if pattern == 'all' else fnmatch.filter(tests, pattern)
+        selected += [int(t) for t in matches if int(t) not in selected]
+    return selected
 
-    return output_times, output_class
+def compare_all(patterns):
+    # Returns the number of files that do not pass, or 1 when the patterns select no test
+    tests = select_tests(patterns)
+    if not tests:
+        print('Error: no test matches', ' '.join(patterns))
+        return 1
+    rows = []
+    for t in tests:
+        rows += compare_test(t)
+    print(f"{'test':<6}{'file':<6}{'max abs error':<16}status")
+    for t, kind, status, max_error in rows:
+        error_text = '-' if max_error is None else f'{max_error:.6f}'
+        print(f"{t:<6}{kind:<6}{error_text:<16}{status}")
+    failures = [row for row in rows if row[2] != 'PASS']
+    print(f"{len(rows) - len(failures)} of {len(rows)} files pass")
+    return len(failures)
 
 def main():
     
     # Check whether there is an input argument 
-    if len(sys.argv) == 2:
+    if len(sys.argv) >= 2 and not (sys.argv[1].isdigit() and (len(sys.argv) == 2 or sys.argv[2] in ['dep', 'mrt'])):
+        return compare_all(sys.argv[1:])
+    elif len(sys.argv) == 2:
         t = int(sys.argv[1])
         test_dep = True
         test_mrt = True      
@@ -72,28 +172,8 @@ def main():
     # Definitions
     file_ext = '.txt' # File extension
     
-    # For trace mode, an absolute tolerance is used
-    ABS_TOL = 1e-3  # Absolute tolerance 
-
     # t is the test number
-    # Tests 0 to 3 are trace mode
-    # Tests 4 to 6 are is random mode
-    trace_mode_test_start = 0
-    trace_mode_test_end = 3 # Tests 1 to 6 
-    random_mode_test_start = 4
-    random_mode_test_end = 6 
-    
-    # For tests 4-6 (which are in random mode), 
-    # the mean response time is expected to be within the range 
-    MRT_TOL = { 
-                 4: {'class_0':[1.414 , 3.3187], 'class_1': [2.6596, 5.4192]}, 
-                 5: {'class_0':[1.5555, 2.5282], 'class_1': [3.3785, 6.8222]}, 
-                 6: {'class_0':[2.0404, 3.5834], 'class_1': [2.9928, 5.2165]} 
-                }
-            
-    
-    
-    if t in range(trace_mode_test_start,trace_mode_test_end+1): 
+    if t in TRACE_MODE_TESTS: 
     
         if test_mrt:
             # Compare mrt against the reference
@@ -102,13 +182,13 @@ def main():
             
             try: 
                 if os.path.isfile(out_file):
-                    mrt_stu = np.loadtxt(out_file)
+                    mrt_stu = read_mrt_file(out_file)
                 else:
                     print('Error: File ',out_file,'does NOT exist')    
                     return
                 
                 if os.path.isfile(ref_file): 
-                    mrt_ref = np.loadtxt(ref_file)
+                    mrt_ref = read_mrt_file(ref_file)
                 else:
                     print('Error: File ',ref_file,'does NOT exist')    
                     return  
@@ -161,11 +241,11 @@ def main():
                 os.system(f'cat output/dep_{t}.txt')
   
     
-    elif t in range(random_mode_test_start,random_mode_test_end+1): 
+    elif t in RANDOM_MODE_TESTS: 
         out_file = os.path.join(out_folder,'mrt_'+str(t)+file_ext)
        
         if os.path.isfile(out_file):
-            mrt_stu = np.loadtxt(out_file)
+            mrt_stu = read_mrt_file(out_file)
         else:
             print('Error: File ',out_file,'does NOT exist')    
             return        
@@ -185,4 +265,6 @@ def main():
         print('The input argument is not a valid test number')
         
 if __name__ == '__main__':
-    dep_error = main()            
\ No newline at end of file
+    # In batch mode main() returns the number of failing files, usable as the exit status
+    dep_error = main()
+    sys.exit(1 if dep_error else 0)            
\ No newline at end of file
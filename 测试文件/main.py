@@ -1,26 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-This program reads in an input argument (which is expected to be
-a positive integer) and write some text to a file with name
-dummy_*.txt where * is the input argument 
-
-
+Runs the simulator in the parent folder on the tests given as arguments,
+reading config/*_<test>.txt and writing output/mrt_<test>.txt and
+output/dep_<test>.txt in this folder, e.g. python3 main.py 0 1 2
 """
 
-import sys 
 import os
-# import numpy as np 
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import main, parse_args  # noqa: E402
 
-def main(s):
-          
-    # As a demonstration, write to a file called dummy_*.txt
-    # in the output directory 
-    out_folder = 'output'
-    dummy_file = os.path.join(out_folder,'dummy_'+s+'.txt')
-    
-    with open(dummy_file,'w') as file:
-        file.writelines(f'The input argument is {s}\n') 
-  
 if __name__ == "__main__":
-   main(sys.argv[1])
+    main(parse_args(['--folder', os.path.dirname(os.path.abspath(__file__))] + sys.argv[1:]))
@@ -1 +1,2 @@
-python3 main.py $1
+#!/bin/sh
+python3 "$(dirname "$0")/main.py" "$@"